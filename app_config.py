@@ -0,0 +1,6 @@
+import json
+
+
+def load_config(path='configopenai.json'):
+    with open(path, 'r') as f:
+        return json.load(f)
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_http_client(config):
+    import httpx
+
+    settings = config.get('http', {})
+    http2 = settings.get('http2', True)
+    if http2 and not _http2_available():
+        logging.warning("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+        http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=settings.get('timeout', 60.0),
+        limits=httpx.Limits(
+            max_connections=settings.get('max_connections', 20),
+            max_keepalive_connections=settings.get('max_keepalive_connections', 10),
+            keepalive_expiry=settings.get('keepalive_expiry', 30.0),
+        ),
+    )
+
+
+class AsyncRuntime:
+    # One event loop thread for the app's lifetime, so GUI callbacks can submit
+    # coroutines without paying for a new loop, thread pool or TLS session per click.
+    def __init__(self, blocking_workers=4):
+        self.blocking_workers = blocking_workers
+        self.loop = None
+        self.executor = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        settings = config.get('http', {})
+        return cls(blocking_workers=settings.get('blocking_workers', 4))
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.loop = asyncio.new_event_loop()
+            self.executor = ThreadPoolExecutor(max_workers=self.blocking_workers)
+            self.loop.set_default_executor(self.executor)
+            self._thread = threading.Thread(target=self._run, name="async-runtime", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self, cleanup=None):
+        # cleanup is an optional coroutine (closing clients) run on the loop before it stops
+        with self._lock:
+            if self._thread is None:
+                return
+            if cleanup is not None:
+                try:
+                    asyncio.run_coroutine_threadsafe(cleanup, self.loop).result(timeout=10)
+                except Exception as e:
+                    logging.error(f"Error during async runtime cleanup: {e}")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self.loop.close()
+            self.executor.shutdown(wait=False)
+            self.loop = None
+            self.executor = None
+            self._thread = None
@@ -0,0 +1,62 @@
+import argparse
+import logging
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantum_engine import (
+    batch_quantum_visuals,
+    mixed_state_to_color_code,
+    numpy_quantum_circuit,
+)
+
+
+def random_inputs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    color_codes = [f'#{c:06x}' for c in rng.integers(0, 0x1000000, size=n).tolist()]
+    datetime_factors = rng.random(n)
+    return color_codes, datetime_factors
+
+
+def run_loop(color_codes, datetime_factors):
+    states, codes = [], []
+    for color_code, datetime_factor in zip(color_codes, datetime_factors):
+        state = numpy_quantum_circuit(color_code, datetime_factor)
+        states.append(state)
+        codes.append(mixed_state_to_color_code(state))
+    return np.array(states), codes
+
+
+def best_of(fn, repeats, *args):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-call loop vs batch circuit evaluation")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 1000, 100000])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    logging.info(f"{'N':>8} {'loop (s)':>12} {'batch (s)':>12} {'speedup':>9}")
+    for n in args.sizes:
+        color_codes, datetime_factors = random_inputs(n)
+        loop_time, (loop_states, loop_codes) = best_of(run_loop, args.repeats, color_codes, datetime_factors)
+        batch_time, (batch_states, batch_codes) = best_of(batch_quantum_visuals, args.repeats, color_codes, datetime_factors)
+        if not np.allclose(loop_states, batch_states) or loop_codes != batch_codes:
+            logging.error(f"Batch results differ from the per-call loop at N={n}")
+            return 1
+        logging.info(f"{n:>8} {loop_time:>12.6f} {batch_time:>12.6f} {loop_time / batch_time:>8.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_batch import best_of, random_inputs  # noqa: E402
+from circuit_templates import get_template, templates  # noqa: E402
+from quantum_engine import batch_mixed_state_to_color_code, batch_quantum_circuit, numpy_quantum_circuit  # noqa: E402
+
+
+def per_call(circuit, color_codes, datetime_factors):
+    for color_code, datetime_factor in zip(color_codes, datetime_factors):
+        circuit(color_code, datetime_factor)
+
+
+def paired_best(first, second, repeats, *args):
+    # alternate the two timings so load spikes and clock changes hit both alike
+    best_first = best_second = float('inf')
+    for _ in range(repeats):
+        best_first = min(best_first, best_of(first, 1, *args)[0])
+        best_second = min(best_second, best_of(second, 1, *args)[0])
+    return best_first, best_second
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compiled circuit templates vs today's four-wire circuit")
+    parser.add_argument('--calls', type=int, default=20000, help="single-state calls per timing")
+    parser.add_argument('--batch', type=int, default=100000)
+    parser.add_argument('--repeats', type=int, default=9)
+    parser.add_argument('--max-ratio', type=float, default=1.0,
+                        help="fail when a template costs more than this factor times today's circuit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    color_codes, datetime_factors = random_inputs(max(args.calls, args.batch))
+    calls = (color_codes[:args.calls], datetime_factors[:args.calls])
+    batch = (color_codes[:args.batch], datetime_factors[:args.batch])
+    rng = random_inputs(args.batch, seed=1)[1]
+
+    def baseline_visuals(codes, factors):
+        return batch_mixed_state_to_color_code(batch_quantum_circuit(codes, factors))
+
+    def baseline_call(codes, factors):
+        per_call(numpy_quantum_circuit, codes, factors)
+
+    base_call, _ = best_of(baseline_call, args.repeats, *calls)
+    base_batch, _ = best_of(baseline_visuals, args.repeats, *batch)
+    logging.info(f"{'circuit':<16} {'wires':>5} {'per call (us)':>14} {'ratio':>6} {'batch visuals (s)':>18} {'ratio':>6}")
+    logging.info(f"{'today':<16} {4:>5} {base_call / args.calls * 1e6:>14.2f} {1:>6.2f} {base_batch:>18.4f} {1:>6.2f}")
+
+    failed = False
+    for name in templates:
+        template = get_template(name)
+        wires = sum(feature is not None for feature in template.encode)
+
+        def template_call(codes, factors, template=template):
+            for color_code, datetime_factor in zip(codes, factors):
+                template.state(color_code, datetime_factor, 0.5, 0.25)
+
+        def template_visuals(codes, factors, template=template):
+            return batch_mixed_state_to_color_code(template.batch(codes, factors, rng, rng))
+
+        # each ratio compares against a baseline timed in the same rounds
+        paired_call, call_time = paired_best(baseline_call, template_call, args.repeats, *calls)
+        paired_batch, batch_time = paired_best(baseline_visuals, template_visuals, args.repeats, *batch)
+        call_ratio, batch_ratio = call_time / paired_call, batch_time / paired_batch
+        logging.info(f"{name:<16} {wires:>5} {call_time / args.calls * 1e6:>14.2f} {call_ratio:>6.2f} "
+                     f"{batch_time:>18.4f} {batch_ratio:>6.2f}")
+        if max(call_ratio, batch_ratio) > args.max_ratio:
+            logging.error(f"{name} costs more than {args.max_ratio}x today's circuit")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+import argparse
+import logging
+import os
+import subprocess
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# cold import budgets in milliseconds, and modules that must stay off each import path
+budgets = {
+    "app_config": 50,
+    "async_runtime": 100,
+    "quantum_engine": 400,
+    "pipeline": 800,
+    "cli": 900,
+    "app": 3000,
+}
+forbidden = {
+    "async_runtime": ["httpx", "numpy"],
+    "pipeline": ["pennylane"],
+    "cli": ["pennylane"],
+    "app": ["pennylane", "numpy", "httpx"],
+}
+
+
+def measure(module):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=root, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return None, set(), result.stderr.strip().splitlines()[-1]
+    total_us = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        imported.add(name.strip().split(".")[0])
+        if name.strip() == module and name.startswith(" ") and not name.startswith("  "):
+            total_us = int(cumulative)
+    return total_us, imported, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold import time budget check (python -X importtime)")
+    parser.add_argument("modules", nargs="*", default=list(budgets))
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget, for slow machines")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    failed = False
+    for module in args.modules:
+        total_us, imported, error = measure(module)
+        if total_us is None:
+            logging.info(f"{module:>16}  skipped ({error})")
+            continue
+        budget_ms = budgets.get(module, float("inf")) * args.scale
+        leaked = [name for name in forbidden.get(module, []) if name in imported]
+        ok = total_us / 1000 <= budget_ms and not leaked
+        failed = failed or not ok
+        note = f"  eagerly imports {', '.join(leaked)}" if leaked else ""
+        logging.info(f"{module:>16} {total_us / 1000:9.1f} ms  budget {budget_ms:7.0f} ms  {'ok' if ok else 'OVER'}{note}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_batch import best_of, random_inputs  # noqa: E402
+from parallel_engine import ProcessPoolEngine  # noqa: E402
+from quantum_engine import batch_quantum_visuals  # noqa: E402
+
+
+def default_worker_counts():
+    counts, workers = [], 1
+    while workers < (os.cpu_count() or 1):
+        counts.append(workers)
+        workers *= 2
+    return counts + [os.cpu_count() or 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process batch vs the shared-memory process pool")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--workers', type=int, nargs='+', default=default_worker_counts())
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--chunk-size', type=int, default=8192)
+    parser.add_argument('--states', action='store_true', help="also copy the (N, 64) states back")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    logging.info(f"{os.cpu_count()} cores, states {'returned' if args.states else 'kept in workers'}")
+    logging.info(f"{'N':>9} {'workers':>8} {'time (s)':>10} {'visuals/s':>12} {'per core/s':>12} {'speedup':>8}")
+    for n in args.sizes:
+        color_codes, datetime_factors = random_inputs(n)
+        base_time, (_, expected) = best_of(batch_quantum_visuals, args.repeats, color_codes, datetime_factors)
+        logging.info(f"{n:>9} {'inproc':>8} {base_time:>10.4f} {n / base_time:>12.0f} {n / base_time:>12.0f} {1:>7.2f}x")
+        for workers in args.workers:
+            engine = ProcessPoolEngine(workers=workers, chunk_size=args.chunk_size, min_batch=0)
+            try:
+                engine.warm_up()
+                pool_time, (_, codes) = best_of(
+                    lambda: engine.batch_quantum_visuals(color_codes, datetime_factors, return_states=args.states),
+                    args.repeats,
+                )
+            finally:
+                engine.close()
+            if codes != expected:
+                logging.error(f"Pool results differ from the in-process batch at N={n}, workers={workers}")
+                return 1
+            throughput = n / pool_time
+            logging.info(f"{n:>9} {workers:>8} {pool_time:>10.4f} {throughput:>12.0f} "
+                         f"{throughput / workers:>12.0f} {base_time / pool_time:>7.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
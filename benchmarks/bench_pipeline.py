@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import bisect
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+import mock_servers  # noqa: E402
+from metrics import metrics  # noqa: E402
+from pipeline import VisualPipeline  # noqa: E402
+
+moods = ["happy", "sad", "excited", "angry", "calm", "tired", "nervous", "relaxed", "bored", "proud"]
+
+
+def current_rss():
+    # resident set size in bytes; /proc is Linux only, elsewhere fall back to the peak so far
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class RssSampler:
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.times = []
+        self.values = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.times.append(time.time())
+            self.values.append(current_rss())
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def peak_between(self, start, end):
+        # peak of the samples inside [start, end], or the nearest earlier sample for short spans
+        lo = bisect.bisect_left(self.times, start)
+        hi = bisect.bisect_right(self.times, end)
+        if lo < hi:
+            return max(self.values[lo:hi])
+        return self.values[max(lo - 1, 0)] if self.values else 0
+
+
+def start_upstream(args):
+    command = [
+        sys.executable, os.path.join(root, "benchmarks", "mock_servers.py"),
+        "--chat-latency", str(args.chat_latency), "--txt2img-latency", str(args.txt2img_latency),
+        "--jitter", str(args.jitter), "--chat-bytes", str(args.chat_bytes), "--image-bytes", str(args.image_bytes),
+    ]
+    # the mocks run in their own process so their CPU and memory stay out of the numbers
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith("listening on "):
+        process.kill()
+        raise RuntimeError(f"mock upstream did not start: {line!r}")
+    return process, int(line.split()[-1])
+
+
+def bench_config(args, port, workdir):
+    base = f"http://127.0.0.1:{port}"
+    return {
+        "openai_api_key": "bench",
+        "openai_url": f"{base}/v1/chat/completions",
+        "stable_url": f"{base}/sdapi/v1/txt2img",
+        "openai_timeout": 30.0,
+        "local_classifier": {"enabled": args.local_classifier},
+        "mapping_cache": {"path": os.path.join(workdir, "mapping_cache.sqlite3")},
+        "http": {"max_connections": args.concurrency * 2, "max_keepalive_connections": args.concurrency * 2},
+        "stable_diffusion": {"max_concurrency": args.render_concurrency, "max_connections": args.render_concurrency,
+                             "retries": 0},
+        "render_cache": {"enabled": args.render_cache, "directory": os.path.join(workdir, "render_cache")},
+        "output_store": {"directory": os.path.join(workdir, "outputs")},
+        "progressive": {"directory": os.path.join(workdir, "previews")},
+        "metrics": {"trace_path": os.path.join(workdir, "trace.jsonl")},
+    }
+
+
+async def drive(pipeline, requests, concurrency, render):
+    queue = asyncio.Queue()
+    for i in range(requests):
+        # distinct mood texts so the mapping cache sees a realistic mix of hits and misses
+        queue.put_nowait(f"{moods[i % len(moods)]} {i % (len(moods) * 5)}")
+    results = []
+
+    async def worker():
+        while not queue.empty():
+            mood = queue.get_nowait()
+            results.append(await pipeline.create_visual(mood, "2099-01-01 12:00", render=render))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results
+
+
+def read_trace(path):
+    spans = {}
+    with open(path) as trace:
+        for line in trace:
+            record = json.loads(line)
+            spans.setdefault(record['stage'], []).append(record)
+    return spans
+
+
+def summarize(spans, sampler, wall):
+    rows = []
+    for stage, records in sorted(spans.items()):
+        durations = np.array([record['duration_ms'] for record in records])
+        p50, p95, p99 = np.percentile(durations, [50, 95, 99])
+        peak = max(sampler.peak_between(record['ts'], record['ts'] + record['duration_ms'] / 1000) for record in records)
+        rows.append({
+            "stage": stage,
+            "count": len(records),
+            "errors": sum(not record['ok'] for record in records),
+            "throughput": len(records) / wall,
+            "p50_ms": p50,
+            "p95_ms": p95,
+            "p99_ms": p99,
+            "peak_rss_mb": peak / (1024 * 1024),
+        })
+    return rows
+
+
+async def run(args, config):
+    pipeline = VisualPipeline(config)
+    try:
+        start = time.perf_counter()
+        results = await drive(pipeline, args.requests, args.concurrency, not args.no_render)
+        return results, time.perf_counter() - start
+    finally:
+        await pipeline.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full pipeline against local OpenAI and txt2img stand-ins")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--render-concurrency', type=int, default=4)
+    parser.add_argument('--render-cache', action='store_true', help="serve repeated colors from the render cache")
+    parser.add_argument('--local-classifier', action='store_true', help="resolve confident moods without GPT-4")
+    parser.add_argument('--no-render', action='store_true', help="stop after the circuit, no txt2img calls")
+    parser.add_argument('--json', help="also write the per-stage rows to this file")
+    mock_servers.add_arguments(parser)
+    args = parser.parse_args()
+
+    # pipeline and httpx chatter stays quiet while the clock is running
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    upstream, port = start_upstream(args)
+    sampler = RssSampler()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            config = bench_config(args, port, workdir)
+            metrics.configure(config)
+            sampler.start()
+            results, wall = asyncio.run(run(args, config))
+            sampler.stop()
+            metrics.close()
+            rows = summarize(read_trace(config['metrics']['trace_path']), sampler, wall)
+    finally:
+        upstream.terminate()
+        upstream.wait()
+
+    logging.getLogger().setLevel(logging.INFO)
+    failed = sum(not args.no_render and not result['image_path'] for result in results)
+    logging.info(f"{len(results)} visuals in {wall:.2f} s ({len(results) / wall:.1f}/s) "
+                 f"at concurrency {args.concurrency}, {failed} without an image")
+    logging.info(f"{'stage':<22} {'count':>6} {'err':>4} {'per s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak RSS MB':>12}")
+    for row in rows:
+        logging.info(f"{row['stage']:<22} {row['count']:>6} {row['errors']:>4} {row['throughput']:>8.1f} "
+                     f"{row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['peak_rss_mb']:>12.1f}")
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({"requests": len(results), "wall_seconds": wall, "failed": failed, "stages": rows}, output, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import random
+import sys
+
+# canned GPT-4 replies in the shapes the pipeline parses
+mapping_reply = (
+    "happy: #FFFF00 (bright yellow)\n"
+    "sad: #0000FF (blue)\n"
+    "excited: #FF4500 (orange red)\n"
+    "angry: #FF0000 (red)\n"
+    "calm: #00FFFF (cyan)\n"
+    "neutral: #808080 (gray)\n"
+)
+sentiment_replies = (
+    "The sentiment of the text is positive.",
+    "The sentiment of the text is negative.",
+    "The sentiment of the text is mixed.",
+)
+png_header = b"\x89PNG\r\n\x1a\n"
+
+
+class MockUpstream:
+    # Stands in for both the OpenAI chat-completions endpoint and the Stable Diffusion
+    # /sdapi/v1/txt2img endpoint on one keep-alive HTTP/1.1 port, with a fixed latency
+    # (plus jitter) and configurable reply sizes.
+    def __init__(self, host="127.0.0.1", port=0, chat_latency=0.05, txt2img_latency=0.2,
+                 jitter=0.1, chat_bytes=0, image_bytes=256 * 1024, image_variants=8, seed=0):
+        self.host = host
+        self.port = port
+        self.chat_latency = chat_latency
+        self.txt2img_latency = txt2img_latency
+        self.jitter = jitter
+        self.chat_bytes = chat_bytes
+        self.random = random.Random(seed)
+        # a few distinct images, built once, so the output store sees more than one hash
+        self.images = [
+            base64.b64encode(png_header + self.random.randbytes(max(image_bytes - len(png_header), 0))).decode()
+            for _ in range(max(image_variants, 1))
+        ]
+        self.requests = {"chat": 0, "txt2img": 0}
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _sleep(self, latency):
+        if latency > 0:
+            await asyncio.sleep(latency * (1 + self.random.uniform(-self.jitter, self.jitter)))
+
+    def chat_completion(self, request):
+        prompt = " ".join(message.get('content', '') for message in request.get('messages', [])
+                          if isinstance(message.get('content'), str))
+        if "mapping" in prompt:
+            content = mapping_reply
+        else:
+            content = sentiment_replies[sum(prompt.encode()) % len(sentiment_replies)]
+        if self.chat_bytes > len(content):
+            # padding lines carry no ':' so the mapping parser skips them
+            content += "\n" + "." * (self.chat_bytes - len(content) - 1)
+        return {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "model": request.get('model', "gpt-4"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        }
+
+    def txt2img(self, request):
+        return {
+            "images": [self.random.choice(self.images)],
+            "parameters": {key: value for key, value in request.items() if key != 'prompt'},
+            "info": "{}",
+        }
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = (await reader.readline()).decode('latin-1').split()
+                if len(request_line) < 2:
+                    break
+                method, path = request_line[0], request_line[1]
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode('latin-1').strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                status, reply = await self._dispatch(method, path, body)
+                payload = json.dumps(reply).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, path, body):
+        try:
+            request = json.loads(body) if body else {}
+        except ValueError:
+            return 400, {"error": "invalid JSON"}
+        if method == 'POST' and path.endswith('/chat/completions'):
+            self.requests["chat"] += 1
+            await self._sleep(self.chat_latency)
+            return 200, self.chat_completion(request)
+        if method == 'POST' and path.endswith('/sdapi/v1/txt2img'):
+            self.requests["txt2img"] += 1
+            await self._sleep(self.txt2img_latency)
+            return 200, self.txt2img(request)
+        if method == 'POST' and path.endswith('/internal/progress'):
+            return 200, {"active": False, "queued": False, "completed": False, "progress": None,
+                         "eta": None, "live_preview": None, "id_live_preview": -1, "textinfo": None}
+        return 404, {"error": f"no route for {method} {path}"}
+
+
+def add_arguments(parser):
+    parser.add_argument('--chat-latency', type=float, default=0.05, help="seconds per chat completion")
+    parser.add_argument('--txt2img-latency', type=float, default=0.2, help="seconds per txt2img render")
+    parser.add_argument('--jitter', type=float, default=0.1, help="+/- fraction applied to each latency")
+    parser.add_argument('--chat-bytes', type=int, default=0, help="pad each completion to this many characters")
+    parser.add_argument('--image-bytes', type=int, default=256 * 1024, help="decoded size of each rendered image")
+
+
+def from_args(args, host="127.0.0.1", port=0):
+    return MockUpstream(
+        host=host,
+        port=port,
+        chat_latency=args.chat_latency,
+        txt2img_latency=args.txt2img_latency,
+        jitter=args.jitter,
+        chat_bytes=args.chat_bytes,
+        image_bytes=args.image_bytes,
+    )
+
+
+async def serve(upstream):
+    port = await upstream.start()
+    # the first stdout line tells a parent process where to connect
+    print(f"listening on {port}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await upstream.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-ins for OpenAI chat completions and txt2img")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=0)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stderr)
+    logging.info(f"mock upstream pid {os.getpid()}")
+    try:
+        asyncio.run(serve(from_args(args, args.host, args.port)))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
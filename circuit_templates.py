@@ -0,0 +1,195 @@
+import functools
+import logging
+import math
+import numpy as np
+from quantum_engine import color_code_to_rgb, num_qubits, parse_color_codes, state_size
+
+# inputs a template can encode, one RY(feature * pi) per wire
+feature_names = ("r", "g", "b", "datetime_factor", "intensity", "time_of_day")
+# cos(x - pi/2) = sin(x), so one cos gives both amplitudes of RY(2x)|0>
+_amplitude_phase = np.array([0.0, np.pi / 2])
+
+# encode: the feature on each wire (None leaves the wire at |0>); entangle: fixed gates
+# applied after the encoding layer, ["cnot", control, target] or ["ry", wire, angle]
+templates = {
+    # today's circuit: wires 4 and 5 unused
+    "classic": {
+        "encode": ["r", "g", "b", "datetime_factor", None, None],
+        "entangle": [["cnot", 0, 1], ["cnot", 1, 2], ["cnot", 2, 3]],
+    },
+    "six_wire_chain": {
+        "encode": list(feature_names),
+        "entangle": [["cnot", wire, wire + 1] for wire in range(num_qubits - 1)],
+    },
+    "six_wire_ring": {
+        "encode": list(feature_names),
+        "entangle": [["cnot", wire, (wire + 1) % num_qubits] for wire in range(num_qubits)]
+                    + [["ry", wire, np.pi / 4] for wire in range(num_qubits)],
+    },
+}
+
+
+def _apply_ry(tensor, wire, angle):
+    c, s = np.cos(angle / 2), np.sin(angle / 2)
+    gate = np.array([[c, -s], [s, c]])
+    return np.moveaxis(np.tensordot(gate, tensor, axes=([1], [wire])), 0, wire)
+
+
+def _apply_cnot(tensor, control, target):
+    tensor = tensor.copy()
+    index = [slice(None)] * tensor.ndim
+    index[control] = 1
+    flipped_axis = target if target < control else target - 1
+    tensor[tuple(index)] = np.flip(tensor[tuple(index)], axis=flipped_axis)
+    return tensor
+
+
+@functools.lru_cache(maxsize=32)
+def compile_entangler(entangle):
+    # the fixed part of a template as one real 64 x 64 matrix, built by pushing the
+    # identity's columns through each gate; wire 0 is the most significant bit
+    tensor = np.eye(state_size).reshape((2,) * num_qubits + (state_size,))
+    for gate in entangle:
+        if gate[0] == 'cnot':
+            tensor = _apply_cnot(tensor, gate[1], gate[2])
+        elif gate[0] == 'ry':
+            tensor = _apply_ry(tensor, gate[1], gate[2])
+        else:
+            raise ValueError(f"Unknown gate {gate[0]!r} in circuit template")
+    unitary = np.ascontiguousarray(tensor.reshape(state_size, state_size))
+    unitary.setflags(write=False)
+    return unitary
+
+
+def _source_rows(unitary):
+    # CNOT-only blocks just move amplitudes around: output amplitude j is product
+    # amplitude source[j]. None when the block mixes amplitudes.
+    if not np.all((unitary == 0) | (unitary == 1)) or not np.all(unitary.sum(axis=1) == 1):
+        return None
+    return unitary.argmax(axis=1)
+
+
+def _product_states(wires):
+    # wires: (6, 2, N) single-wire amplitudes -> (64, N) product states, wire 0 most
+    # significant. Amplitude-major keeps every multiply on long contiguous rows, and
+    # building two 8-entry halves first skips the 16 and 32 entry intermediates.
+    n = wires.shape[-1]
+    high = (wires[0][:, np.newaxis] * wires[1][np.newaxis]).reshape(4, n)
+    high = (high[:, np.newaxis] * wires[2][np.newaxis]).reshape(8, n)
+    low = (wires[3][:, np.newaxis] * wires[4][np.newaxis]).reshape(4, n)
+    low = (low[:, np.newaxis] * wires[5][np.newaxis]).reshape(8, n)
+    return (high[:, np.newaxis] * low[np.newaxis]).reshape(state_size, n)
+
+
+class CircuitTemplate:
+    # RY feature encoding on every wire, then a fixed entangling block compiled once,
+    # so a call is a 64 entry product state and one matrix-vector product (or, when
+    # the block is only CNOTs, one gather). Every gate is real, so states are float64.
+    def __init__(self, name, encode, entangle):
+        if len(encode) != num_qubits:
+            raise ValueError(f"Circuit template {name!r} must encode {num_qubits} wires")
+        unknown = [feature for feature in encode if feature is not None and feature not in feature_names]
+        if unknown:
+            raise ValueError(f"Circuit template {name!r} uses unknown features {unknown}")
+        self.name = name
+        self.encode = tuple(encode)
+        self.entangle = tuple(tuple(gate) for gate in entangle)
+        self.unitary = compile_entangler(self.entangle)
+        self.source = _source_rows(self.unitary)
+        # unused wires read the constant zero feature appended after feature_names
+        self._columns = np.array([feature_names.index(feature) if feature else len(feature_names)
+                                  for feature in self.encode])
+        self._wire_columns = self._columns.tolist()
+
+    def batch_states(self, features):
+        # features: (N, 6) in feature_names order -> (N, 64) float64 states, returned as
+        # the transpose of an amplitude-major array (no copy)
+        features = np.asarray(features, dtype=float).reshape(-1, len(feature_names))
+        padded = np.vstack([features.T, np.zeros((1, len(features)))])
+        wires = np.cos(padded[self._columns, np.newaxis] * (np.pi / 2) - _amplitude_phase[:, np.newaxis])
+        product = _product_states(wires)
+        if self.source is not None:
+            return np.take(product, self.source, axis=0).T
+        return (self.unitary @ product).T
+
+    def state(self, color_code, datetime_factor, intensity=0.0, time_of_day=0.0):
+        # for one state numpy's per-call overhead outweighs the arithmetic, so the
+        # single-wire amplitudes and the two 8 entry halves are plain floats and numpy
+        # only does the final outer product
+        values = (*color_code_to_rgb(color_code), float(datetime_factor), intensity, time_of_day, 0.0)
+        wires = [(math.cos(values[column] * (math.pi / 2)), math.sin(values[column] * (math.pi / 2)))
+                 for column in self._wire_columns]
+        high = [a * b * c for a in wires[0] for b in wires[1] for c in wires[2]]
+        low = [a * b * c for a in wires[3] for b in wires[4] for c in wires[5]]
+        amplitudes = np.multiply.outer(high, low).ravel()
+        if self.source is not None:
+            return amplitudes[self.source]
+        return self.unitary @ amplitudes
+
+    def batch(self, color_codes, datetime_factors, intensities=None, times_of_day=None):
+        n = len(color_codes)
+        features = np.zeros((n, len(feature_names)))
+        features[:, :3] = parse_color_codes(color_codes)
+        features[:, 3] = datetime_factors
+        if intensities is not None:
+            features[:, 4] = intensities
+        if times_of_day is not None:
+            features[:, 5] = times_of_day
+        return self.batch_states(features)
+
+
+def load_template(config):
+    # "circuit_template" names a built-in template or one from "circuit_templates"
+    name = config.get('circuit_template', "classic")
+    definitions = dict(templates, **config.get('circuit_templates', {}))
+    if name not in definitions:
+        logging.error(f"Unknown circuit template {name!r}, using classic")
+        name = "classic"
+    return get_template(name, definitions[name])
+
+
+def get_template(name, definition=None):
+    definition = definition or templates[name]
+    return CircuitTemplate(name, definition['encode'], definition['entangle'])
+
+
+def build_qnode(template):
+    # the same circuit gate by gate as a PennyLane QNode taking features in
+    # feature_names order, for circuit_engine "pennylane" and the check below
+    import pennylane as qml
+
+    dev = qml.device('default.qubit', wires=num_qubits)
+
+    @qml.qnode(dev)
+    def template_qnode(features):
+        for wire, feature in enumerate(template.encode):
+            if feature:
+                qml.RY(features[feature_names.index(feature)] * np.pi, wires=wire)
+        for gate in template.entangle:
+            if gate[0] == 'cnot':
+                qml.CNOT(wires=[gate[1], gate[2]])
+            else:
+                qml.RY(gate[2], wires=gate[1])
+        return qml.state()
+
+    return template_qnode
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    rng = np.random.default_rng(0)
+    worst = 0.0
+    for name in templates:
+        template = get_template(name)
+        qnode_circuit = build_qnode(template)
+        for _ in range(20):
+            features = rng.random(len(feature_names))
+            color_code = '#' + bytes(int(round(value * 255)) for value in features[:3]).hex()
+            features[:3] = np.array(color_code_to_rgb(color_code))
+            expected = np.asarray(qnode_circuit(features))
+            actual = template.state(color_code, *features[3:])
+            batched = template.batch_states(features[np.newaxis])[0]
+            worst = max(worst, float(np.max(np.abs(expected - actual))), float(np.max(np.abs(expected - batched))))
+        logging.info(f"{name}: checked against the QNode")
+    logging.info(f"Max amplitude difference between compiled templates and QNodes: {worst:.3e}")
+    raise SystemExit(0 if worst < 1e-10 else 1)
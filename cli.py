@@ -0,0 +1,166 @@
+import argparse
+import asyncio
+import json
+import logging
+import re
+import sys
+from app_config import load_config
+from pipeline import VisualPipeline
+from prewarm import load_checkouts
+from server import VisualServer
+from metrics import metrics
+
+color_code_pattern = re.compile(r"#[0-9a-fA-F]{6}")
+
+
+def read_jsonl(path):
+    stream = sys.stdin if path == '-' else open(path, 'r')
+    try:
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as e:
+                logging.error(f"Skipping line {line_number}: {e}")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+async def run_batch(pipeline, input_path, output, concurrency, render):
+    # a fixed set of workers pulls from a bounded queue, so memory stays flat no matter
+    # how many lines the input has; results are written in completion order
+    queue = asyncio.Queue(maxsize=concurrency * 4)
+    processed = 0
+
+    async def worker():
+        nonlocal processed
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            line_number, entry = item
+            try:
+                result = await pipeline.create_visual(entry['mood'], entry['checkout_time'], render=render)
+            except Exception as e:
+                result = {"error": str(e)}
+            result["line"] = line_number
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            processed += 1
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    for line_number, entry in read_jsonl(input_path):
+        if not isinstance(entry, dict) or 'mood' not in entry or 'checkout_time' not in entry:
+            logging.error(f"Skipping line {line_number}: expected mood and checkout_time")
+            continue
+        await queue.put((line_number, entry))
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+    logging.info(f"Processed {processed} visuals")
+
+
+def precompute(engine, input_path, output):
+    # color-only precompute for large jobs: the whole file goes through the process
+    # pool as one batch and never touches the network
+    line_numbers, color_codes, datetime_factors = [], [], []
+    for line_number, entry in read_jsonl(input_path):
+        if (not isinstance(entry, dict)
+                or not isinstance(entry.get('color_code'), str)
+                or not color_code_pattern.fullmatch(entry['color_code'])
+                or not isinstance(entry.get('datetime_factor'), (int, float))
+                or isinstance(entry['datetime_factor'], bool)):
+            logging.error(f"Skipping line {line_number}: expected a #RRGGBB color_code and a numeric datetime_factor")
+            continue
+        line_numbers.append(line_number)
+        color_codes.append(entry['color_code'])
+        datetime_factors.append(entry['datetime_factor'])
+    _, visual_colors = engine.batch_quantum_visuals(color_codes, datetime_factors, return_states=False)
+    for line_number, color_code, datetime_factor, visual_color in zip(
+            line_numbers, color_codes, datetime_factors, visual_colors):
+        output.write(json.dumps({
+            "color_code": color_code,
+            "datetime_factor": datetime_factor,
+            "visual_color": visual_color,
+            "line": line_number,
+        }) + "\n")
+    logging.info(f"Precomputed {len(visual_colors)} visual colors")
+
+
+async def main_async(args, config):
+    pipeline = VisualPipeline(config)
+    try:
+        if args.command == 'batch':
+            output = sys.stdout if args.output == '-' else open(args.output, 'w')
+            try:
+                await run_batch(pipeline, args.input, output, args.concurrency, not args.no_render)
+            finally:
+                if output is not sys.stdout:
+                    output.close()
+        elif args.command == 'serve':
+            server = VisualServer.from_config(config, pipeline)
+            server.host = args.host or server.host
+            server.port = args.port or server.port
+            server.workers = args.workers or server.workers
+            await server.serve_forever()
+        elif args.command == 'prewarm':
+            await pipeline.prewarm(load_checkouts(args.checkouts))
+    finally:
+        await pipeline.aclose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quantum visual pipeline without the Kivy UI")
+    parser.add_argument('--config', default='configopenai.json')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    batch = subparsers.add_parser('batch', help="process JSONL lines of {mood, checkout_time}")
+    batch.add_argument('--input', default='-')
+    batch.add_argument('--output', default='-')
+    batch.add_argument('--concurrency', type=int, default=4)
+    batch.add_argument('--no-render', action='store_true', help="compute colors only")
+
+    serve = subparsers.add_parser('serve', help="HTTP service: POST /visual, GET /healthz")
+    serve.add_argument('--host')
+    serve.add_argument('--port', type=int)
+    serve.add_argument('--workers', type=int)
+
+    prewarm = subparsers.add_parser('prewarm', help="render upcoming checkouts into the cache")
+    prewarm.add_argument('checkouts')
+
+    precompute_parser = subparsers.add_parser(
+        'precompute', help="visual colors for JSONL lines of {color_code, datetime_factor} on a process pool")
+    precompute_parser.add_argument('--input', default='-')
+    precompute_parser.add_argument('--output', default='-')
+    precompute_parser.add_argument('--workers', type=int)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    config = load_config(args.config)
+    if args.command == 'precompute':
+        from parallel_engine import ProcessPoolEngine
+
+        engine = ProcessPoolEngine.from_config(config)
+        engine.workers = args.workers or engine.workers
+        output = sys.stdout if args.output == '-' else open(args.output, 'w')
+        try:
+            precompute(engine, args.input, output)
+        finally:
+            engine.close()
+            if output is not sys.stdout:
+                output.close()
+        return
+    metrics.configure(config)
+    try:
+        asyncio.run(main_async(args, config))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        metrics.close()
+
+
+if __name__ == "__main__":
+    main()
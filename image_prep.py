@@ -0,0 +1,86 @@
+import base64
+import hashlib
+import io
+import logging
+import threading
+from collections import OrderedDict
+
+
+def file_digest(path, block_size=1024 * 1024):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as image_file:
+        for block in iter(lambda: image_file.read(block_size), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def encode_jpeg(path, max_side=512, max_bytes=150 * 1024, quality=85, min_quality=40):
+    # downscale so the longer side is at most max_side, then lower the JPEG quality
+    # until the encoding fits in max_bytes (or min_quality is reached)
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image = image.convert('RGB')
+        image.thumbnail((max_side, max_side))
+        while True:
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=quality, optimize=True)
+            if buffer.tell() <= max_bytes or quality <= min_quality:
+                return buffer.getvalue()
+            quality = max(min_quality, quality - 15)
+
+
+class VisionImageCache:
+    # In-memory LRU of content hash -> JPEG data URI and content hash -> vision reply,
+    # so a render that is analysed again skips both the re-encode and the API call.
+    def __init__(self, max_side=512, max_bytes=150 * 1024, quality=85, min_quality=40, size=256):
+        self.max_side = max_side
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.min_quality = min_quality
+        self.size = size
+        self._payloads = OrderedDict()
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        settings = config.get('vision', {})
+        return cls(
+            max_side=settings.get('max_side', 512),
+            max_bytes=settings.get('max_bytes', 150 * 1024),
+            quality=settings.get('quality', 85),
+            min_quality=settings.get('min_quality', 40),
+            size=settings.get('cache_size', 256),
+        )
+
+    def _get(self, entries, key):
+        with self._lock:
+            value = entries.get(key)
+            if value is not None:
+                entries.move_to_end(key)
+            return value
+
+    def _put(self, entries, key, value):
+        with self._lock:
+            entries[key] = value
+            entries.move_to_end(key)
+            while len(entries) > self.size:
+                entries.popitem(last=False)
+
+    def prepare(self, path):
+        # blocking: hashes the file and, on a miss, decodes and re-encodes it
+        digest = file_digest(path)
+        data_uri = self._get(self._payloads, digest)
+        if data_uri is None:
+            jpeg = encode_jpeg(path, self.max_side, self.max_bytes, self.quality, self.min_quality)
+            data_uri = f"data:image/jpeg;base64,{base64.b64encode(jpeg).decode('ascii')}"
+            logging.debug(f"Encoded {path} for vision as {len(jpeg)} bytes of JPEG")
+            self._put(self._payloads, digest, data_uri)
+        return digest, data_uri
+
+    def get_result(self, digest):
+        return self._get(self._results, digest)
+
+    def put_result(self, digest, result):
+        self._put(self._results, digest, result)
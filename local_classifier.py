@@ -0,0 +1,147 @@
+import json
+import logging
+import re
+import numpy as np
+
+# same emotions and colors as the example mapping in the GPT-4 prompt
+emotion_colors = {
+    "happy": "#FFFF00",
+    "sad": "#0000FF",
+    "excited": "#FF4500",
+    "angry": "#FF0000",
+    "calm": "#00FFFF",
+    "neutral": "#808080",
+}
+
+default_lexicon = {
+    "happy": ["happy", "glad", "joyful", "cheerful", "content", "pleased", "delighted", "good", "great",
+              "wonderful", "fantastic", "awesome", "amazing", "positive", "grateful", "thankful", "satisfied", "fine"],
+    "sad": ["sad", "unhappy", "down", "blue", "depressed", "miserable", "gloomy", "lonely", "heartbroken",
+            "upset", "disappointed", "tired", "exhausted", "bad", "awful", "terrible", "negative", "low"],
+    "excited": ["excited", "thrilled", "eager", "pumped", "hyped", "energetic", "ecstatic", "elated",
+                "enthusiastic", "stoked", "psyched"],
+    "angry": ["angry", "mad", "furious", "annoyed", "irritated", "frustrated", "livid", "outraged", "enraged",
+              "pissed", "grumpy", "cross"],
+    "calm": ["calm", "relaxed", "peaceful", "serene", "chill", "tranquil", "mellow", "rested", "zen", "easy"],
+    "neutral": ["neutral", "okay", "ok", "meh", "normal", "average", "alright", "indifferent", "so-so"],
+}
+
+stopwords = {
+    "i", "im", "i'm", "am", "feel", "feeling", "feels", "so", "very", "really", "quite", "pretty", "a", "an",
+    "the", "and", "just", "today", "now", "bit", "little", "kind", "kinda", "of", "is", "it", "it's", "me",
+    "my", "rather", "extremely", "super", "totally", "right", "at", "this", "moment", "to", "be", "being",
+}
+negations = {"not", "no", "never", "nothing", "nor", "without", "dont", "isnt", "hardly", "barely"}
+intensifiers = {"very", "really", "so", "extremely", "super", "totally", "incredibly", "absolutely",
+                "completely", "utterly", "too", "most"}
+token_pattern = re.compile(r"[a-z][a-z'-]*")
+
+
+def mood_intensity(mood_text):
+    # 0 for a plain mood, rising to 1 with intensifiers, '!' and shouted words
+    words = mood_text.split()
+    score = sum(word.lower().strip('!.,') in intensifiers for word in words)
+    score += min(mood_text.count('!'), 3)
+    score += sum(len(word) > 2 and word.isupper() for word in words)
+    return min(score / 3.0, 1.0)
+
+
+class LexiconClassifier:
+    # Scores a mood against a word -> emotion weight matrix. Confidence is the top
+    # emotion's share of all evidence, where unknown and negated words count as evidence
+    # against, so "happy" is certain and "happy but not sure about tomorrow" goes to GPT-4.
+    def __init__(self, lexicon=None, colors=None, unknown_weight=0.5):
+        lexicon = default_lexicon if lexicon is None else lexicon
+        self.colors = dict(emotion_colors if colors is None else colors)
+        self.emotions = list(self.colors) + [emotion for emotion in lexicon if emotion not in self.colors]
+        self.unknown_weight = unknown_weight
+        self.vocabulary = {}
+        rows = []
+        for emotion, words in lexicon.items():
+            for word in words:
+                weights = words[word] if isinstance(words, dict) else 1.0
+                row = self.vocabulary.get(word)
+                if row is None:
+                    row = self.vocabulary[word] = len(rows)
+                    rows.append(np.zeros(len(self.emotions)))
+                rows[row][self.emotions.index(emotion)] += weights
+        self.weights = np.array(rows).reshape(len(rows), len(self.emotions))
+
+    @classmethod
+    def load(cls, path, unknown_weight=0.5):
+        # {"colors": {emotion: "#RRGGBB"}, "lexicon": {emotion: [words] or {word: weight}}}
+        with open(path, 'r') as lexicon_file:
+            data = json.load(lexicon_file)
+        return cls(lexicon=data['lexicon'], colors=data.get('colors'), unknown_weight=unknown_weight)
+
+    def classify(self, mood_text):
+        rows = []
+        unknown = 0
+        negated = False
+        for token in token_pattern.findall(mood_text.lower().replace('\u2019', "'")):
+            if token in negations or token.endswith("n't"):
+                negated = True
+                continue
+            if token in stopwords and token not in self.vocabulary:
+                # "not feeling great", "not very happy": the negation carries over
+                continue
+            row = self.vocabulary.get(token)
+            if row is not None and not negated:
+                rows.append(row)
+            else:
+                unknown += 1
+            negated = False
+        if not rows:
+            return "neutral", 0.0
+        scores = self.weights[rows].sum(axis=0)
+        best = int(scores.argmax())
+        confidence = scores[best] / (scores.sum() + self.unknown_weight * unknown)
+        return self.emotions[best], float(confidence)
+
+    def color_for(self, emotion):
+        return self.colors.get(emotion, "#808080")
+
+
+def load_classifier(config):
+    # None turns the local tier off and every mood goes to GPT-4
+    settings = config.get('local_classifier', {})
+    if not settings.get('enabled', True):
+        return None
+    unknown_weight = settings.get('unknown_weight', 0.5)
+    lexicon_path = settings.get('lexicon_path')
+    if lexicon_path:
+        try:
+            return LexiconClassifier.load(lexicon_path, unknown_weight)
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"Error loading lexicon from {lexicon_path}, using the built-in one: {e}")
+    return LexiconClassifier(unknown_weight=unknown_weight)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    classifier = LexiconClassifier()
+    threshold = 0.75
+    # mood -> emotion the local tier must resolve, or None when it must defer to GPT-4
+    cases = {
+        "happy": "happy",
+        "I'm feeling really happy": "happy",
+        "so calm today": "calm",
+        "FURIOUS": "angry",
+        "I don't feel good": None,
+        "I don\u2019t feel good": None,
+        "i'm not feeling great": None,
+        "not very happy": None,
+        "not really happy": None,
+        "never been this excited": None,
+        "not happy about the queue": None,
+        "happy but not sure about tomorrow": None,
+    }
+    failed = 0
+    for mood, expected in cases.items():
+        emotion, confidence = classifier.classify(mood)
+        resolved = emotion if confidence >= threshold else None
+        if resolved != expected:
+            logging.error(f"{mood!r}: expected {expected}, got {emotion} ({confidence:.2f})")
+            failed += 1
+    logging.info(f"{len(cases) - failed} of {len(cases)} moods classified as expected")
+    raise SystemExit(1 if failed else 0)
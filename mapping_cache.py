@@ -0,0 +1,116 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_mood(mood_text):
+    return ' '.join(mood_text.lower().split())
+
+
+class MappingCache:
+    def __init__(self, path="mapping_cache.sqlite3", ttl_seconds=7 * 24 * 3600,
+                 memory_size=512, disk_size=10000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS mappings ("
+                "mood TEXT PRIMARY KEY, mapping TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS mappings_created ON mappings (created)")
+            self._db.commit()
+
+    @classmethod
+    def from_config(cls, config):
+        settings = config.get('mapping_cache', {})
+        return cls(
+            path=settings.get('path', "mapping_cache.sqlite3"),
+            ttl_seconds=settings.get('ttl_seconds', 7 * 24 * 3600),
+            memory_size=settings.get('memory_size', 512),
+            disk_size=settings.get('disk_size', 10000),
+        )
+
+    def _expired(self, created):
+        return self.ttl_seconds is not None and time.time() - created > self.ttl_seconds
+
+    def get(self, mood_text):
+        key = normalize_mood(mood_text)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                mapping, created = entry
+                if not self._expired(created):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return dict(mapping)
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT mapping, created FROM mappings WHERE mood = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    mapping, created = json.loads(row[0]), row[1]
+                    if not self._expired(created):
+                        self._remember(key, mapping, created)
+                        self.disk_hits += 1
+                        return dict(mapping)
+                    self._db.execute("DELETE FROM mappings WHERE mood = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def put(self, mood_text, mapping):
+        key = normalize_mood(mood_text)
+        created = time.time()
+        with self._lock:
+            self._remember(key, dict(mapping), created)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO mappings (mood, mapping, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(mapping), created),
+                )
+                self._db.execute(
+                    "DELETE FROM mappings WHERE mood IN ("
+                    "SELECT mood FROM mappings ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                    (self.disk_size,),
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Error writing emotion-color mapping cache: {e}")
+
+    def _remember(self, key, mapping, created):
+        self._memory[key] = (mapping, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+            }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
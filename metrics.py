@@ -0,0 +1,170 @@
+import contextlib
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+latency_buckets = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+descriptions = {
+    "visual_stage_seconds": ("histogram", "Latency of each visual pipeline stage"),
+    "visual_stage_in_flight": ("gauge", "Visual pipeline stages currently running"),
+    "visual_stage_errors_total": ("counter", "Visual pipeline stages that raised"),
+    "visual_cache_hits_total": ("counter", "Cache hits by cache"),
+    "visual_cache_misses_total": ("counter", "Cache misses by cache"),
+    "visual_local_classifier_total": ("counter", "Moods resolved locally or deferred to GPT-4"),
+    "visual_coalesced_total": ("counter", "Calls that joined an identical in-flight upstream call"),
+    "upstream_queue_depth": ("gauge", "Calls waiting for an upstream rate limiter slot"),
+    "upstream_concurrency_limit": ("gauge", "Current adaptive concurrency limit per upstream"),
+    "upstream_throttled_total": ("counter", "429/503 responses per upstream"),
+}
+
+
+def _label_text(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in items) + "}"
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._trace_file = None
+        self._server = None
+
+    def configure(self, config):
+        # optional exporters from the "metrics" section: a Prometheus text endpoint
+        # and a JSONL trace file with one line per finished span
+        settings = config.get('metrics', {})
+        if settings.get('trace_path') and self._trace_file is None:
+            self._trace_file = open(settings['trace_path'], 'a', buffering=1)
+        if settings.get('port') and self._server is None:
+            self.start_http_server(settings['port'], settings.get('host', "127.0.0.1"))
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge_add(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + value
+
+    def gauge_set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(latency_buckets), 0.0, 0]
+            for i, bound in enumerate(latency_buckets):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def cache_result(self, cache, hit):
+        self.inc("visual_cache_hits_total" if hit else "visual_cache_misses_total", cache=cache)
+
+    @contextlib.contextmanager
+    def span(self, stage):
+        self.gauge_add("visual_stage_in_flight", 1, stage=stage)
+        wall_start = time.time()
+        start = time.perf_counter()
+        ok = True
+        try:
+            yield
+        except BaseException:
+            ok = False
+            self.inc("visual_stage_errors_total", stage=stage)
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            self.gauge_add("visual_stage_in_flight", -1, stage=stage)
+            self.observe("visual_stage_seconds", duration, stage=stage)
+            if self._trace_file is not None:
+                self._write_trace({"ts": wall_start, "stage": stage, "duration_ms": duration * 1000, "ok": ok})
+
+    def _write_trace(self, record):
+        try:
+            with self._lock:
+                self._trace_file.write(json.dumps(record) + "\n")
+        except (OSError, ValueError) as e:
+            logging.error(f"Error writing metrics trace: {e}")
+
+    def histogram_summary(self, name="visual_stage_seconds"):
+        with self._lock:
+            return {
+                dict(labels).get('stage', ''): {"count": count, "sum": total}
+                for (metric, labels), (_, total, count) in self._histograms.items()
+                if metric == name
+            }
+
+    def render_prometheus(self):
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: (list(b), s, c) for key, (b, s, c) in self._histograms.items()}
+        lines = []
+        for name, (kind, description) in descriptions.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, bucket_count in zip(latency_buckets, buckets):
+                        lines.append(f"{name}_bucket{_label_text(labels, ('le', bound))} {bucket_count}")
+                    lines.append(f"{name}_bucket{_label_text(labels, ('le', '+Inf'))} {count}")
+                    lines.append(f"{name}_sum{_label_text(labels)} {total}")
+                    lines.append(f"{name}_count{_label_text(labels)} {count}")
+            else:
+                values = counters if kind == "counter" else gauges
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_label_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def start_http_server(self, port, host="127.0.0.1"):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        logging.info(f"Metrics on http://{host}:{port}/metrics")
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._trace_file is not None:
+            self._trace_file.close()
+            self._trace_file = None
+
+
+metrics = Metrics()
@@ -0,0 +1,146 @@
+import base64
+import hashlib
+import logging
+import os
+import tempfile
+import time
+
+images_key = b'"images"'
+
+
+class Base64Sink:
+    def __init__(self, file):
+        self.file = file
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self._pending = b''
+
+    def feed(self, data):
+        # decode whole 4 character groups only, the rest waits for the next chunk;
+        # JSON may escape '/' as '\/' so backslashes are dropped
+        data = self._pending + data.replace(b'\\', b'')
+        cut = len(data) - len(data) % 4
+        self._pending = data[cut:]
+        if cut:
+            image_bytes = base64.b64decode(data[:cut], validate=True)
+            self.file.write(image_bytes)
+            self.sha256.update(image_bytes)
+            self.size += len(image_bytes)
+
+    def finish(self):
+        if self._pending:
+            raise ValueError("Truncated base64 image data in the response")
+
+
+async def stream_first_image(chunks, file):
+    # Pull the first string of the txt2img "images" array out of the JSON body and
+    # decode it straight into file, so neither the body nor the image is held in memory.
+    sink = Base64Sink(file)
+    buffer = b''
+    state = 'key'
+    async for chunk in chunks:
+        if state == 'done':
+            continue
+        buffer += chunk
+        if state == 'key':
+            index = buffer.find(images_key)
+            if index < 0:
+                buffer = buffer[-(len(images_key) - 1):]
+                continue
+            buffer = buffer[index + len(images_key):]
+            state = 'open'
+        if state == 'open':
+            index = buffer.find(b'"')
+            prefix = buffer if index < 0 else buffer[:index]
+            if prefix.strip(b' \t\r\n:['):
+                raise ValueError("No images found in the response")
+            if index < 0:
+                buffer = b''
+                continue
+            buffer = buffer[index + 1:]
+            state = 'data'
+        if state == 'data':
+            index = buffer.find(b'"')
+            if index < 0:
+                sink.feed(buffer)
+                buffer = b''
+                continue
+            sink.feed(buffer[:index])
+            sink.finish()
+            buffer = b''
+            state = 'done'
+    if state != 'done':
+        raise ValueError("No images found in the response")
+    return sink
+
+
+async def stream_to_temp_file(chunks, directory):
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as image_file:
+            sink = await stream_first_image(chunks, image_file)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path, sink
+
+
+class OutputStore:
+    def __init__(self, directory="outputs", max_bytes=256 * 1024 * 1024, max_age_seconds=24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config):
+        settings = config.get('output_store', {})
+        return cls(
+            directory=settings.get('directory', "outputs"),
+            max_bytes=settings.get('max_bytes', 256 * 1024 * 1024),
+            max_age_seconds=settings.get('max_age_seconds', 24 * 3600),
+        )
+
+    async def save(self, chunks):
+        temp_path, sink = await stream_to_temp_file(chunks, self.directory)
+        # content-hash names never collide between concurrent renders, identical
+        # images collapse onto one file and the rename makes the write atomic
+        image_path = os.path.join(self.directory, f"{sink.sha256.hexdigest()}.png")
+        os.replace(temp_path, image_path)
+        self.evict(keep=image_path)
+        return image_path
+
+    def save_bytes(self, image_bytes):
+        image_path = os.path.join(self.directory, f"{hashlib.sha256(image_bytes).hexdigest()}.png")
+        if not os.path.exists(image_path):
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as image_file:
+                image_file.write(image_bytes)
+            os.replace(temp_path, image_path)
+            self.evict(keep=image_path)
+        return image_path
+
+    def evict(self, keep=None):
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.png') or entry.path == keep:
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        if keep and os.path.exists(keep):
+            total += os.path.getsize(keep)
+        for mtime, size, path in entries:
+            expired = self.max_age_seconds is not None and now - mtime > self.max_age_seconds
+            if not expired and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError as e:
+                logging.error(f"Error evicting output {path}: {e}")
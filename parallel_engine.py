@@ -0,0 +1,181 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from quantum_engine import (
+    batch_mixed_state_to_rgb,
+    batch_quantum_circuit_rgb,
+    batch_quantum_visuals,
+    batch_mixed_state_to_color_code,
+    parse_color_codes,
+    rgb_to_color_codes,
+    state_size,
+)
+
+
+def _attach(name, shape, dtype):
+    # pool workers share the parent's resource tracker, so attaching only re-registers
+    # a name it already holds; the parent unlinks every block once the batch is done
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def _circuit_rows(inputs_name, states_name, rgb_name, n, start, stop, chunk_size):
+    # worker: rows [start, stop) of the (N, 4) rgb + datetime inputs -> states and rgb
+    blocks = []
+    inputs = rgb = states = chunk = None
+    try:
+        block, inputs = _attach(inputs_name, (n, 4), np.float64)
+        blocks.append(block)
+        block, rgb = _attach(rgb_name, (n, 3), np.uint8)
+        blocks.append(block)
+        if states_name:
+            block, states = _attach(states_name, (n, state_size), np.complex128)
+            blocks.append(block)
+        for begin in range(start, stop, chunk_size):
+            end = min(begin + chunk_size, stop)
+            chunk = batch_quantum_circuit_rgb(
+                inputs[begin:end, :3], inputs[begin:end, 3], out=None if states is None else states[begin:end]
+            )
+            batch_mixed_state_to_rgb(chunk, out=rgb[begin:end])
+    finally:
+        # views into a block must be gone before it can be closed
+        inputs = rgb = states = chunk = None
+        for block in blocks:
+            block.close()
+
+
+def _color_rows(states_name, rgb_name, n, start, stop, chunk_size):
+    # worker: rows [start, stop) of an (N, 64) state batch -> rgb
+    blocks = []
+    states = rgb = None
+    try:
+        block, states = _attach(states_name, (n, state_size), np.complex128)
+        blocks.append(block)
+        block, rgb = _attach(rgb_name, (n, 3), np.uint8)
+        blocks.append(block)
+        for begin in range(start, stop, chunk_size):
+            end = min(begin + chunk_size, stop)
+            batch_mixed_state_to_rgb(states[begin:end], out=rgb[begin:end])
+    finally:
+        states = rgb = None
+        for block in blocks:
+            block.close()
+
+
+class ProcessPoolEngine:
+    # Spreads batch circuit and color work over worker processes. Inputs and outputs
+    # live in shared memory blocks that every worker maps, so only block names and row
+    # ranges are pickled. Batches under min_batch stay in-process, where the pool's
+    # fixed cost would outweigh the gain.
+    def __init__(self, workers=None, chunk_size=8192, min_batch=20000, start_method="spawn"):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.min_batch = min_batch
+        self.start_method = start_method
+        self._executor = None
+
+    @classmethod
+    def from_config(cls, config):
+        settings = config.get('process_pool', {})
+        return cls(
+            workers=settings.get('workers'),
+            chunk_size=settings.get('chunk_size', 8192),
+            min_batch=settings.get('min_batch', 20000),
+            start_method=settings.get('start_method', "spawn"),
+        )
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context(self.start_method)
+            )
+        return self._executor
+
+    def warm_up(self):
+        # start every worker (and its numpy import) before the first timed batch
+        futures = [self.executor.submit(os.getpid) for _ in range(self.workers)]
+        return {future.result() for future in futures}
+
+    def _ranges(self, n):
+        # a few ranges per worker so a slow worker does not hold up the whole batch
+        parts = min(n, self.workers * 4)
+        bounds = np.linspace(0, n, parts + 1).astype(int)
+        return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+    def _run(self, function, *args, n):
+        futures = [self.executor.submit(function, *args, n, start, stop, self.chunk_size)
+                   for start, stop in self._ranges(n)]
+        for future in futures:
+            future.result()
+
+    def batch_quantum_visuals(self, color_codes, datetime_factors, return_states=True):
+        # same results as quantum_engine.batch_quantum_visuals; with return_states=False
+        # the (N, 64) states never leave the workers, which is what large precompute
+        # jobs that only need color codes want
+        n = len(color_codes)
+        if n < self.min_batch:
+            states, codes = batch_quantum_visuals(color_codes, datetime_factors)
+            return (states if return_states else None), codes
+        datetime_factors = np.asarray(datetime_factors, dtype=float).reshape(-1)
+        if len(datetime_factors) != n:
+            raise ValueError("color_codes and datetime_factors must have the same length")
+
+        blocks = []
+        try:
+            inputs_block = self._allocate(blocks, n * 4 * 8)
+            rgb_block = self._allocate(blocks, n * 3)
+            states_block = self._allocate(blocks, n * state_size * 16) if return_states else None
+            inputs = np.ndarray((n, 4), dtype=np.float64, buffer=inputs_block.buf)
+            inputs[:, :3] = parse_color_codes(color_codes)
+            inputs[:, 3] = datetime_factors
+            self._run(_circuit_rows, inputs_block.name, states_block.name if states_block else None,
+                      rgb_block.name, n=n)
+            rgb = np.ndarray((n, 3), dtype=np.uint8, buffer=rgb_block.buf)
+            codes = rgb_to_color_codes(rgb)
+            states = None
+            if return_states:
+                states = np.ndarray((n, state_size), dtype=np.complex128, buffer=states_block.buf).copy()
+            del inputs, rgb
+            return states, codes
+        finally:
+            self._release(blocks)
+
+    def batch_mixed_state_to_color_code(self, states):
+        states = np.asarray(states, dtype=np.complex128)
+        n = len(states)
+        if n < self.min_batch:
+            return batch_mixed_state_to_color_code(states)
+        blocks = []
+        try:
+            states_block = self._allocate(blocks, states.nbytes)
+            rgb_block = self._allocate(blocks, n * 3)
+            shared_states = np.ndarray(states.shape, dtype=np.complex128, buffer=states_block.buf)
+            shared_states[:] = states
+            self._run(_color_rows, states_block.name, rgb_block.name, n=n)
+            rgb = np.ndarray((n, 3), dtype=np.uint8, buffer=rgb_block.buf).copy()
+            del shared_states
+            return rgb, rgb_to_color_codes(rgb)
+        finally:
+            self._release(blocks)
+
+    def _allocate(self, blocks, size):
+        block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        blocks.append(block)
+        return block
+
+    def _release(self, blocks):
+        for block in blocks:
+            try:
+                block.unlink()
+                block.close()
+            except (BufferError, OSError) as e:
+                logging.error(f"Error releasing shared memory {block.name}: {e}")
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
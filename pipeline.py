@@ -0,0 +1,453 @@
+import asyncio
+import base64
+import logging
+import uuid
+from datetime import datetime
+import httpx
+import numpy as np
+from quantum_engine import color_code_to_rgb, num_qubits, numpy_quantum_circuit, mixed_state_to_color_code
+from mapping_cache import MappingCache, normalize_mood
+from async_runtime import create_http_client
+from sd_client import StableDiffusionClient
+from render_cache import RenderCache
+from output_store import OutputStore
+from prewarm import PrewarmScheduler, datetime_factor_at, time_of_day_at
+from metrics import metrics
+from singleflight import SingleFlight
+from preview import gradient_swatch_png
+from local_classifier import load_classifier, mood_intensity
+from circuit_templates import build_qnode, load_template
+from rate_limiter import AdaptiveLimiter, request_priority, prewarm as prewarm_priority, throttle_status_codes
+
+openai_url = "https://api.openai.com/v1/chat/completions"
+prompt_template = "Generate an image with predominant color {color_code}"
+
+
+class VisualPipeline:
+    # mood -> emotion-color map -> sentiment -> circuit -> color -> render, with no UI
+    # attached; every coroutine must run on the loop that owns the HTTP clients.
+    def __init__(self, config):
+        self.config = config
+        self.openai_api_key = config['openai_api_key']
+        self.openai_url = config.get('openai_url', openai_url)
+        self.circuit_engine = config.get('circuit_engine', 'numpy')
+        self.circuit_template = load_template(config)
+        self.openai_timeout = config.get('openai_timeout', 30.0)
+        self.local_classifier = load_classifier(config)
+        self.local_threshold = config.get('local_classifier', {}).get('threshold', 0.75)
+        render_settings = config.get('render', {})
+        self.render_steps = render_settings.get('steps', 121)
+        self.render_width = render_settings.get('width', 666)
+        self.render_height = render_settings.get('height', 456)
+        self.client = create_http_client(config)
+        self.openai_limiter = AdaptiveLimiter.from_config(config, "openai")
+        self.openai_retries = config.get('rate_limits', {}).get('openai', {}).get('retries', 2)
+        self.mapping_cache = MappingCache.from_config(config)
+        self.sd_client = StableDiffusionClient.from_config(config)
+        self.render_cache = RenderCache.from_config(config)
+        self.output_store = OutputStore.from_config(config)
+        progressive = config.get('progressive', {})
+        self.progressive = progressive.get('enabled', True)
+        self.preview_swatch = progressive.get('swatch', True)
+        self.preview_low_steps = progressive.get('low_steps', 0)
+        self.progress_poll_seconds = progressive.get('progress_poll_seconds', 1.0)
+        self.preview_store = OutputStore(
+            directory=progressive.get('directory', "outputs/previews"),
+            max_bytes=progressive.get('max_bytes', 32 * 1024 * 1024),
+            max_age_seconds=progressive.get('max_age_seconds', 3600),
+        ) if self.progressive else None
+        # identical moods and colors arriving together share one upstream call
+        self.mapping_flights = SingleFlight("gpt4_mapping")
+        self.sentiment_flights = SingleFlight("gpt4_sentiment")
+        self.render_flights = SingleFlight("txt2img")
+        self.active_visuals = 0
+        self._qnode = None
+        self._template_qnode = None
+
+    async def aclose(self):
+        await self.client.aclose()
+        await self.sd_client.aclose()
+        self.mapping_cache.close()
+
+    async def create_visual(self, mood_text, checkout_time_str, render=True, on_preview=None):
+        # on_preview(path) is called with quick stand-in images while the full render runs
+        self.active_visuals += 1
+        try:
+            with metrics.span("create_visual"):
+                with metrics.span("process_mood_and_time"):
+                    color_code, datetime_factor = await self.process_mood_and_time(mood_text, checkout_time_str)
+                features = self.circuit_features(mood_text, checkout_time_str)
+                quantum_state = self.quantum_circuit(color_code, datetime_factor, *features)
+                image_path = await self.generate_image_from_quantum_data(quantum_state, on_preview) if render else None
+            return {
+                "mood": mood_text,
+                "checkout_time": checkout_time_str,
+                "color_code": color_code,
+                "datetime_factor": datetime_factor,
+                "visual_color": mixed_state_to_color_code(quantum_state),
+                "image_path": image_path,
+            }
+        finally:
+            self.active_visuals -= 1
+
+    async def resolve_mood_color(self, mood_text, checkout_time_str):
+        color_code, datetime_factor = await self.process_mood_and_time(mood_text, checkout_time_str)
+        return color_code
+
+    async def render_visual(self, color_code, datetime_factor, mood_text=None, checkout_time_str=None):
+        features = self.circuit_features(mood_text, checkout_time_str)
+        quantum_state = self.quantum_circuit(color_code, datetime_factor, *features)
+        return await self.generate_image_from_quantum_data(quantum_state)
+
+    async def prewarm(self, checkouts):
+        scheduler = PrewarmScheduler.from_config(
+            self.config, self.resolve_mood_color, self.render_visual,
+            is_idle=lambda: self.active_visuals == 0,
+        )
+        # prewarm calls queue behind interactive ones at every upstream limiter
+        token = request_priority.set(prewarm_priority)
+        try:
+            await scheduler.run(checkouts)
+        finally:
+            request_priority.reset(token)
+        return scheduler
+
+    def circuit_features(self, mood_text, checkout_time_str):
+        # mood intensity and time of day feed wires 4 and 5 in the six-wire templates
+        intensity = mood_intensity(mood_text) if mood_text else 0.0
+        try:
+            time_of_day = time_of_day_at(checkout_time_str) if checkout_time_str else 0.0
+        except ValueError:
+            time_of_day = 0.0
+        return intensity, time_of_day
+
+    def quantum_circuit(self, color_code, datetime_factor, intensity=0.0, time_of_day=0.0):
+        with metrics.span("quantum_circuit"):
+            if self.circuit_engine == 'pennylane':
+                if self.circuit_template.name == 'classic':
+                    return self.qnode_quantum_circuit(color_code, datetime_factor)
+                return self.template_qnode_circuit(color_code, datetime_factor, intensity, time_of_day)
+            if self.circuit_template.name == 'classic':
+                return numpy_quantum_circuit(color_code, datetime_factor)
+            return self.circuit_template.state(color_code, datetime_factor, intensity, time_of_day)
+
+    def qnode_quantum_circuit(self, color_code, datetime_factor):
+        if self._qnode is None:
+            import pennylane as qml
+
+            dev = qml.device('default.qubit', wires=num_qubits)
+
+            @qml.qnode(dev)
+            def qnode_quantum_circuit(color_code, datetime_factor):
+                r, g, b = [int(color_code[i:i+2], 16) for i in (1, 3, 5)]
+                r, g, b = r / 255.0, g / 255.0, b / 255.0
+                qml.RY(r * np.pi, wires=0)
+                qml.RY(g * np.pi, wires=1)
+                qml.RY(b * np.pi, wires=2)
+                qml.RY(datetime_factor * np.pi, wires=3)
+                qml.CNOT(wires=[0, 1])
+                qml.CNOT(wires=[1, 2])
+                qml.CNOT(wires=[2, 3])
+                return qml.state()
+
+            self._qnode = qnode_quantum_circuit
+        return self._qnode(color_code, datetime_factor)
+
+    def template_qnode_circuit(self, color_code, datetime_factor, intensity, time_of_day):
+        if self._template_qnode is None:
+            self._template_qnode = build_qnode(self.circuit_template)
+        features = (*color_code_to_rgb(color_code), datetime_factor, intensity, time_of_day)
+        return self._template_qnode(np.array(features))
+
+    async def post_chat_completion(self, json_body):
+        # throttled replies pause the limiter until Retry-After and are retried within
+        # the caller's openai_timeout instead of turning straight into the gray fallback
+        for attempt in range(self.openai_retries + 1):
+            await self.openai_limiter.acquire()
+            response = None
+            try:
+                response = await self.client.post(
+                    self.openai_url,
+                    headers={"Authorization": f"Bearer {self.openai_api_key}"},
+                    json=json_body,
+                )
+            finally:
+                self.openai_limiter.release(response)
+            if response.status_code not in throttle_status_codes or attempt >= self.openai_retries:
+                break
+        response.raise_for_status()
+        return response.json()
+
+    def upstream_stats(self):
+        return {
+            "openai": self.openai_limiter.stats(),
+            "stable_diffusion": self.sd_client.limiter.stats(),
+        }
+
+    def classify_mood_locally(self, mood_text):
+        # returns a color when the local tier is confident enough, otherwise None
+        if self.local_classifier is None:
+            return None
+        with metrics.span("local_classifier"):
+            emotion, confidence = self.local_classifier.classify(mood_text)
+        if confidence < self.local_threshold:
+            metrics.inc("visual_local_classifier_total", result="deferred")
+            return None
+        metrics.inc("visual_local_classifier_total", result="resolved")
+        logging.debug(f"Local classifier resolved '{mood_text}' as {emotion} ({confidence:.2f})")
+        return self.local_classifier.color_for(emotion)
+
+    async def process_mood_and_time(self, mood_text, checkout_time_str):
+        color_code = self.classify_mood_locally(mood_text)
+        if color_code is not None:
+            return color_code, self.calculate_datetime_factor(checkout_time_str)
+        # The color mapping and the sentiment completion are independent until the
+        # final lookup, so both run at once and a failure in either cancels the other.
+        mapping_task = asyncio.ensure_future(
+            asyncio.wait_for(self.generate_emotion_color_mapping(mood_text), self.openai_timeout)
+        )
+        sentiment_task = asyncio.ensure_future(
+            asyncio.wait_for(self.request_gpt4_sentiment(mood_text), self.openai_timeout)
+        )
+        try:
+            pending = {mapping_task, sentiment_task}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                if mapping_task in done and mapping_task.result() is None:
+                    logging.error("emotion_color_map is None")
+                    return "#808080", 1
+                if sentiment_task in done and sentiment_task.result() is None:
+                    logging.error("Invalid response structure from GPT-4")
+                    return "#808080", 1
+
+            datetime_factor = self.calculate_datetime_factor(checkout_time_str)
+            sentiment = self.interpret_gpt4_sentiment(sentiment_task.result())
+            return mapping_task.result().get(sentiment, "#808080"), datetime_factor
+        except asyncio.TimeoutError:
+            logging.error(f"GPT-4 call timed out after {self.openai_timeout} seconds")
+            return "#808080", 1
+        except Exception as e:
+            logging.error(f"Error in mood and time processing: {e}")
+            return "#808080", 1
+        finally:
+            for task in (mapping_task, sentiment_task):
+                task.cancel()
+
+    async def request_gpt4_sentiment(self, mood_text):
+        return await self.sentiment_flights.do(
+            normalize_mood(mood_text), lambda: self._request_gpt4_sentiment(mood_text)
+        )
+
+    async def _request_gpt4_sentiment(self, mood_text):
+        with metrics.span("gpt4_sentiment"):
+            result = await self.post_chat_completion({
+                "model": "gpt-4",
+                "messages": [
+                    {"role": "system", "content": "Determine the sentiment of the following text. Provide HTML color Coodes"},
+                    {"role": "user", "content": f"Determine the sentiment of the following text by designing a colorized sentiment factor Provide Html Color CODES for each reply's  following inspective test [inspective text] {mood_text}[/inspectiveteext]"}
+                ]
+            })
+        if result is None or 'choices' not in result or len(result['choices']) == 0:
+            return None
+        return result
+
+    def calculate_datetime_factor(self, checkout_time_str, now=None):
+        try:
+            return datetime_factor_at(checkout_time_str, now or datetime.now())
+        except Exception as e:
+            logging.error(f"Error in calculating datetime factor: {e}")
+            return 1
+
+    async def generate_emotion_color_mapping(self, user_mood):
+        cached_map = self.mapping_cache.get(user_mood)
+        metrics.cache_result("mapping", cached_map is not None)
+        if cached_map is not None:
+            logging.debug(f"Emotion-color mapping cache hit for '{user_mood}'")
+            return cached_map
+        return await self.mapping_flights.do(
+            normalize_mood(user_mood), lambda: self.fetch_emotion_color_mapping(user_mood)
+        )
+
+    async def fetch_emotion_color_mapping(self, user_mood):
+        prompt = (
+            f"The user's current mood is '{user_mood}'. Based on this, "
+            "create a detailed mapping of emotions to specific colors, "
+            "considering how colors can influence mood and perception. "
+            "The mapping should be in a clear, list format. "
+            "For example:\n"
+            "[example]\n"
+            "happy: #FFFF00 (bright yellow),\n"
+            "sad: #0000FF (blue),\n"
+            "excited: #FF4500 (orange red),\n"
+            "angry: #FF0000 (red),\n"
+            "calm: #00FFFF (cyan),\n"
+            "neutral: #808080 (gray)\n"
+            "[/example]\n"
+            "Now, based on the mood '{user_mood}', provide a similar mapping."
+        )
+        try:
+            with metrics.span("gpt4_mapping"):
+                result = await self.post_chat_completion({
+                    "model": "gpt-4",
+                    "messages": [{"role": "system", "content": prompt}]
+                })
+            logging.debug(f"GPT-4 response for emotion-color mapping: {result}")
+            emotion_color_map = self.parse_emotion_color_mapping(result)
+            if emotion_color_map:
+                self.mapping_cache.put(user_mood, emotion_color_map)
+            return emotion_color_map
+        except httpx.HTTPStatusError as e:
+            logging.error(f"HTTP error occurred: {e.response.status_code}")
+            return None
+        except httpx.RequestError as e:
+            logging.error(f"An error occurred while requesting: {e}")
+            return None
+        except Exception as e:
+            logging.error(f"Error in generating emotion-color mapping: {e}")
+            return None
+
+    def parse_emotion_color_mapping(self, gpt4_response):
+        try:
+            if 'choices' in gpt4_response and len(gpt4_response['choices']) > 0:
+                response_text = gpt4_response['choices'][0]['message']['content']
+                emotion_color_map = {}
+                for line in response_text.split('\n'):
+                    if ':' in line:
+                        emotion, color = line.split(':', 1)
+                        emotion = emotion.strip().lower()
+                        color_code = color.strip().split(' ')[0]
+                        emotion_color_map[emotion] = color_code
+                return emotion_color_map
+            else:
+                logging.error("Invalid response structure from GPT-4")
+                return {}
+        except Exception as e:
+            logging.error(f"Error in parsing emotion-color mapping: {e}")
+            return {}
+
+    def interpret_gpt4_sentiment(self, gpt4_response):
+        try:
+            response_text = gpt4_response['choices'][0]['message']['content'].lower()
+            if "positive" in response_text:
+                return "happy"
+            elif "negative" in response_text:
+                return "sad"
+            else:
+                return "neutral"
+        except Exception as e:
+            logging.error(f"Error in interpreting sentiment: {e}")
+            return "neutral"
+
+    async def generate_image_from_quantum_data(self, quantum_state, on_preview=None):
+        with metrics.span("generate_image"):
+            return await self._generate_image(quantum_state, on_preview if self.progressive else None)
+
+    def show_preview(self, on_preview, image_path):
+        try:
+            on_preview(image_path)
+        except Exception as e:
+            logging.error(f"Error showing preview {image_path}: {e}")
+
+    def show_swatch(self, on_preview, color_code):
+        try:
+            with metrics.span("preview_swatch"):
+                swatch = gradient_swatch_png(color_code, self.render_width // 4, self.render_height // 4)
+                image_path = self.preview_store.save_bytes(swatch)
+        except Exception as e:
+            logging.error(f"Error in preview swatch: {e}")
+            return
+        self.show_preview(on_preview, image_path)
+
+    async def show_low_step_render(self, on_preview, payload):
+        # a few steps at half size cost a fraction of the full render
+        low_payload = dict(payload, steps=self.preview_low_steps,
+                           width=self.render_width // 2, height=self.render_height // 2)
+        try:
+            with metrics.span("txt2img_preview"):
+                image_path = await self.sd_client.txt2img_stream(
+                    low_payload, lambda response: self.preview_store.save(response.aiter_bytes())
+                )
+        except Exception as e:
+            logging.error(f"Error in preview render: {e}")
+            return
+        self.show_preview(on_preview, image_path)
+
+    async def _poll_progress(self, on_preview, task_id):
+        # the render was submitted with force_task_id=task_id, so only its own live
+        # previews come back even when several kiosks share the txt2img server
+        preview_id = -1
+        try:
+            while True:
+                await asyncio.sleep(self.progress_poll_seconds)
+                progress = await self.sd_client.progress(task_id, preview_id)
+                if progress is None or progress.get('completed'):
+                    return
+                live_preview = progress.get('live_preview')
+                if live_preview:
+                    preview_id = progress.get('id_live_preview', preview_id)
+                    image = base64.b64decode(live_preview.split(',', 1)[-1])
+                    self.show_preview(on_preview, self.preview_store.save_bytes(image))
+        except Exception as e:
+            logging.error(f"Error in progress preview: {e}")
+
+    async def _store_image(self, response, cache_key):
+        with metrics.span("image_write"):
+            if cache_key:
+                return await self.render_cache.put_stream(cache_key, response.aiter_bytes())
+            return await self.output_store.save(response.aiter_bytes())
+
+    async def _generate_image(self, quantum_state, on_preview=None):
+        try:
+            color_code = mixed_state_to_color_code(quantum_state)
+            cache_key = None
+            if self.render_cache.enabled:
+                color_code = self.render_cache.quantize(color_code)
+                cache_key = self.render_cache.key(
+                    color_code, prompt_template, self.render_steps, self.render_width, self.render_height
+                )
+                cached_path = self.render_cache.get(cache_key)
+                metrics.cache_result("render", cached_path is not None)
+                if cached_path:
+                    logging.info(f"Render cache hit for {color_code}: {cached_path}")
+                    return cached_path
+            if on_preview and self.preview_swatch:
+                self.show_swatch(on_preview, color_code)
+            if cache_key:
+                return await self.render_flights.do(cache_key, lambda: self._render(color_code, cache_key, on_preview))
+            return await self._render(color_code, None, on_preview)
+        except Exception as e:
+            logging.error(f"Error in image generation: {e}")
+            return None
+
+    async def _render(self, color_code, cache_key, on_preview=None):
+        progress_task = None
+        try:
+            prompt = prompt_template.format(color_code=color_code)
+            payload = {
+                "prompt": prompt,
+                "steps": self.render_steps,
+                "seed": self.render_cache.seed_for(color_code),
+                "enable_hr": "false",
+                "denoising_strength": "0.7",
+                "cfg_scale": "7",
+                "width": self.render_width,
+                "height": self.render_height,
+                "restore_faces": "true",
+            }
+            if on_preview and self.preview_low_steps:
+                await self.show_low_step_render(on_preview, payload)
+            if on_preview and self.progress_poll_seconds and self.sd_client.progress_url:
+                task_id = payload["force_task_id"] = f"task({uuid.uuid4().hex})"
+                progress_task = asyncio.ensure_future(self._poll_progress(on_preview, task_id))
+            with metrics.span("txt2img"):
+                image_path = await self.sd_client.txt2img_stream(
+                    payload, lambda response: self._store_image(response, cache_key)
+                )
+            logging.info(f"Image saved to {image_path}")
+            return image_path
+        except Exception as e:
+            logging.error(f"Error in image generation: {e}")
+            return None
+        finally:
+            if progress_task is not None:
+                progress_task.cancel()
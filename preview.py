@@ -0,0 +1,21 @@
+import io
+import numpy as np
+from quantum_engine import color_code_to_rgb
+
+
+def gradient_swatch(color_code, width, height):
+    # a diagonal light-to-dark wash of the color, shown while the real render runs
+    r, g, b = color_code_to_rgb(color_code)
+    y = np.linspace(0.0, 1.0, height)[:, None]
+    x = np.linspace(0.0, 1.0, width)[None, :]
+    shade = 1.15 - 0.55 * (0.7 * y + 0.3 * x)
+    pixels = np.clip(np.array([r, g, b])[None, None, :] * shade[:, :, None], 0.0, 1.0)
+    return (pixels * 255).astype(np.uint8)
+
+
+def gradient_swatch_png(color_code, width, height):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.fromarray(gradient_swatch(color_code, width, height), 'RGB').save(buffer, format='PNG')
+    return buffer.getvalue()
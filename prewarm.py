@@ -0,0 +1,119 @@
+import asyncio
+import csv
+import json
+import logging
+import time
+from collections import deque
+from datetime import datetime
+
+checkout_time_format = "%Y-%m-%d %H:%M"
+
+
+def datetime_factor_at(checkout_time_str, now):
+    checkout_time = datetime.strptime(checkout_time_str, checkout_time_format)
+    time_diff = (checkout_time - now).total_seconds()
+    return max(0, 1 - time_diff / (24 * 3600))
+
+
+def time_of_day_at(checkout_time_str):
+    checkout_time = datetime.strptime(checkout_time_str, checkout_time_format)
+    return (checkout_time.hour * 60 + checkout_time.minute) / (24 * 60)
+
+
+def load_checkouts(path):
+    # JSON: [{"mood": ..., "checkout_time": ..., "trigger_time": ...}, ...]
+    # CSV: header row with mood,checkout_time[,trigger_time]
+    with open(path, 'r', newline='') as f:
+        if path.endswith('.json'):
+            entries = json.load(f)
+        else:
+            entries = list(csv.DictReader(f))
+    checkouts = []
+    for entry in entries:
+        if not entry.get('mood') or not entry.get('checkout_time'):
+            logging.error(f"Skipping checkout entry without mood or checkout_time: {entry}")
+            continue
+        checkout = {
+            "mood": entry['mood'],
+            "checkout_time": entry['checkout_time'],
+            # guests usually trigger the visual at checkout, where the factor reaches 1
+            "trigger_time": entry.get('trigger_time') or entry['checkout_time'],
+        }
+        try:
+            datetime.strptime(checkout['checkout_time'], checkout_time_format)
+            datetime.strptime(checkout['trigger_time'], checkout_time_format)
+        except ValueError as e:
+            logging.error(f"Skipping checkout entry with invalid time: {e}")
+            continue
+        checkouts.append(checkout)
+    return checkouts
+
+
+class PrewarmScheduler:
+    def __init__(self, resolve_color, render, is_idle=None, max_concurrency=1,
+                 max_renders_per_hour=60, idle_poll_seconds=5.0):
+        self.resolve_color = resolve_color
+        self.render = render
+        self.is_idle = is_idle or (lambda: True)
+        self.max_concurrency = max_concurrency
+        self.max_renders_per_hour = max_renders_per_hour
+        self.idle_poll_seconds = idle_poll_seconds
+        self.prewarmed = 0
+        self.failed = 0
+        self._render_times = deque()
+
+    @classmethod
+    def from_config(cls, config, resolve_color, render, is_idle=None):
+        settings = config.get('prewarm', {})
+        return cls(
+            resolve_color,
+            render,
+            is_idle=is_idle,
+            max_concurrency=settings.get('max_concurrency', 1),
+            max_renders_per_hour=settings.get('max_renders_per_hour', 60),
+            idle_poll_seconds=settings.get('idle_poll_seconds', 5.0),
+        )
+
+    async def run(self, checkouts, now=None):
+        now = now or datetime.now()
+        upcoming = [
+            entry for entry in checkouts
+            if datetime.strptime(entry['trigger_time'], checkout_time_format) >= now
+        ]
+        upcoming.sort(key=lambda entry: entry['trigger_time'])
+        logging.info(f"Prewarming {len(upcoming)} of {len(checkouts)} checkouts")
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        await asyncio.gather(*(self._prewarm(entry, semaphore) for entry in upcoming))
+        logging.info(f"Prewarm finished: {self.prewarmed} rendered, {self.failed} failed")
+
+    async def _prewarm(self, entry, semaphore):
+        async with semaphore:
+            await self._wait_until_idle()
+            await self._wait_for_budget()
+            try:
+                color_code = await self.resolve_color(entry['mood'], entry['checkout_time'])
+                trigger_time = datetime.strptime(entry['trigger_time'], checkout_time_format)
+                datetime_factor = datetime_factor_at(entry['checkout_time'], trigger_time)
+                image_path = await self.render(color_code, datetime_factor, entry['mood'], entry['checkout_time'])
+            except Exception as e:
+                logging.error(f"Error prewarming checkout {entry}: {e}")
+                image_path = None
+            if image_path:
+                self.prewarmed += 1
+            else:
+                self.failed += 1
+
+    async def _wait_for_budget(self):
+        # sliding one hour window of render starts caps the GPU time spent on prewarm
+        while True:
+            cutoff = time.monotonic() - 3600
+            while self._render_times and self._render_times[0] < cutoff:
+                self._render_times.popleft()
+            if len(self._render_times) < self.max_renders_per_hour:
+                self._render_times.append(time.monotonic())
+                return
+            await asyncio.sleep(self._render_times[0] - cutoff)
+
+    async def _wait_until_idle(self):
+        while not self.is_idle():
+            await asyncio.sleep(self.idle_poll_seconds)
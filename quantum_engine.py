@@ -0,0 +1,165 @@
+import functools
+import logging
+import random
+import numpy as np
+
+num_qubits = 6
+state_size = 2 ** num_qubits
+
+
+def _cnot_chain_targets():
+    # quantum_circuit only rotates wires 0-3 and then runs CNOT(0,1), CNOT(1,2),
+    # CNOT(2,3), so every product basis state |b0 b1 b2 b3> lands on exactly one
+    # basis state of the 6 wire register (wires 4 and 5 stay |0>).
+    targets = np.empty(16, dtype=np.intp)
+    for k in range(16):
+        b0, b1, b2, b3 = (k >> 3) & 1, (k >> 2) & 1, (k >> 1) & 1, k & 1
+        b1 ^= b0
+        b2 ^= b1
+        b3 ^= b2
+        targets[k] = ((b0 << 3) | (b1 << 2) | (b2 << 1) | b3) << (num_qubits - 4)
+    return targets
+
+
+_targets = _cnot_chain_targets()
+
+
+def color_code_to_rgb(color_code):
+    r, g, b = [int(color_code[i:i+2], 16) for i in (1, 3, 5)]
+    return r / 255.0, g / 255.0, b / 255.0
+
+
+def numpy_quantum_circuit(color_code, datetime_factor):
+    r, g, b = color_code_to_rgb(color_code)
+    half_angles = np.array([r, g, b, float(datetime_factor)]) * (np.pi / 2)
+    cos, sin = np.cos(half_angles), np.sin(half_angles)
+
+    # RY(theta)|0> = cos(theta/2)|0> + sin(theta/2)|1>, wire 0 is the most significant bit
+    amplitudes = np.multiply.outer(
+        np.multiply.outer(np.multiply.outer((cos[0], sin[0]), (cos[1], sin[1])), (cos[2], sin[2])),
+        (cos[3], sin[3]),
+    ).ravel()
+
+    state = np.zeros(state_size, dtype=np.complex128)
+    state[_targets] = amplitudes
+    return state
+
+
+def parse_color_codes(color_codes):
+    # '#rrggbb' prefixes only, the same characters quantum_circuit slices out
+    hex_digits = ''.join(color_code[1:7] for color_code in color_codes)
+    rgb = np.frombuffer(bytes.fromhex(hex_digits), dtype=np.uint8).reshape(-1, 3)
+    return rgb / 255.0
+
+
+def batch_quantum_circuit(color_codes, datetime_factors):
+    return batch_quantum_circuit_rgb(parse_color_codes(color_codes), datetime_factors)
+
+
+def batch_quantum_circuit_rgb(rgb, datetime_factors, out=None):
+    # rgb is an (N, 3) array of channels in [0, 1]; out, if given, is an (N, 64)
+    # complex128 buffer (for example a slice of shared memory) to write the states into
+    datetime_factors = np.asarray(datetime_factors, dtype=float).reshape(-1, 1)
+    if len(rgb) != len(datetime_factors):
+        raise ValueError("color_codes and datetime_factors must have the same length")
+
+    half_angles = np.hstack([rgb, datetime_factors]) * (np.pi / 2)
+    wires = np.stack([np.cos(half_angles), np.sin(half_angles)], axis=-1)
+    amplitudes = np.einsum(
+        'ni,nj,nk,nl->nijkl', wires[:, 0], wires[:, 1], wires[:, 2], wires[:, 3]
+    ).reshape(len(rgb), 16)
+
+    if out is None:
+        out = np.empty((len(rgb), state_size), dtype=np.complex128)
+    out.fill(0)
+    out[:, _targets] = amplitudes
+    return out
+
+
+@functools.lru_cache(maxsize=None)
+def _channel_bins(size, interleaved):
+    # Column c sums the probabilities that fall into third c of the state, with the
+    # same split as the original [:n//3], [n//3:2n//3], [2n//3:] slices. For complex
+    # states the float64 view interleaves (real, imag), so every row appears twice.
+    bins = np.zeros((size, 3))
+    bins[:size//3, 0] = 1
+    bins[size//3:2*size//3, 1] = 1
+    bins[2*size//3:, 2] = 1
+    if interleaved:
+        bins = np.repeat(bins, 2, axis=0)
+    bins.setflags(write=False)
+    return bins
+
+
+def batch_mixed_state_to_rgb(states, out=None):
+    states = np.asarray(states)
+    if states.ndim == 1:
+        states = states[np.newaxis]
+    interleaved = np.iscomplexobj(states)
+    # the float64 view of complex states needs contiguous rows, real states work in any layout
+    components = np.ascontiguousarray(states).view(np.float64) if interleaved else states.astype(np.float64, copy=False)
+
+    # |a|^2 = re^2 + im^2, so one square over the float view and one matmul against
+    # the bin matrix gives all three channel sums for the whole batch.
+    squares = np.square(components)
+    channels = squares @ _channel_bins(states.shape[1], interleaved)
+    channels *= 255 / channels.sum(axis=1, keepdims=True)
+
+    if out is None:
+        out = np.empty((len(channels), 3), dtype=np.uint8)
+    np.copyto(out, channels, casting='unsafe')
+    return out
+
+
+def rgb_to_color_codes(rgb):
+    hex_digits = np.ascontiguousarray(rgb, dtype=np.uint8).tobytes().hex()
+    return ['#' + hex_digits[i:i+6] for i in range(0, len(hex_digits), 6)]
+
+
+def batch_mixed_state_to_color_code(states):
+    rgb = batch_mixed_state_to_rgb(states)
+    return rgb, rgb_to_color_codes(rgb)
+
+
+def mixed_state_to_color_code(mixed_state):
+    return rgb_to_color_codes(batch_mixed_state_to_rgb(mixed_state))[0]
+
+
+def batch_quantum_visuals(color_codes, datetime_factors):
+    states = batch_quantum_circuit(color_codes, datetime_factors)
+    return states, batch_mixed_state_to_color_code(states)[1]
+
+
+def max_amplitude_error(reference_circuit, samples=100, seed=0):
+    rng = random.Random(seed)
+    worst = 0.0
+    for _ in range(samples):
+        color_code = f'#{rng.randrange(0x1000000):06x}'
+        datetime_factor = rng.random()
+        expected = np.asarray(reference_circuit(color_code, datetime_factor))
+        actual = numpy_quantum_circuit(color_code, datetime_factor)
+        worst = max(worst, float(np.max(np.abs(expected - actual))))
+    return worst
+
+
+if __name__ == "__main__":
+    import pennylane as qml
+
+    logging.basicConfig(level=logging.INFO)
+    dev = qml.device('default.qubit', wires=num_qubits)
+
+    @qml.qnode(dev)
+    def qnode_quantum_circuit(color_code, datetime_factor):
+        r, g, b = color_code_to_rgb(color_code)
+        qml.RY(r * np.pi, wires=0)
+        qml.RY(g * np.pi, wires=1)
+        qml.RY(b * np.pi, wires=2)
+        qml.RY(datetime_factor * np.pi, wires=3)
+        qml.CNOT(wires=[0, 1])
+        qml.CNOT(wires=[1, 2])
+        qml.CNOT(wires=[2, 3])
+        return qml.state()
+
+    error = max_amplitude_error(qnode_quantum_circuit)
+    logging.info(f"Max amplitude difference between numpy engine and QNode: {error:.3e}")
+    raise SystemExit(0 if error < 1e-10 else 1)
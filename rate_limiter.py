@@ -0,0 +1,149 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from metrics import metrics
+
+interactive = 0
+prewarm = 10
+# priority of upstream calls made from the current task; prewarm work sets it lower
+request_priority = contextvars.ContextVar('request_priority', default=interactive)
+
+throttle_status_codes = {429, 503}
+
+
+def parse_retry_after(value, now=None):
+    # Retry-After is either delay-seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - (now or time.time()), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    # Token bucket for the request rate plus an AIMD concurrency limit: each success
+    # raises the limit by about one per limit's worth of calls, each 429/503 cuts it by
+    # `decrease` and holds every caller until Retry-After. Waiters are served by priority.
+    def __init__(self, name, rate=None, burst=1, initial_concurrency=4, min_concurrency=1,
+                 max_concurrency=16, decrease=0.5, default_retry_after=1.0):
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self.decrease = decrease
+        self.default_retry_after = default_retry_after
+        self.in_flight = 0
+        self.throttled = 0
+        self._tokens = float(self.burst)
+        self._refilled = time.monotonic()
+        self._blocked_until = 0.0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._timer = None
+
+    @classmethod
+    def from_config(cls, config, name, max_concurrency=16):
+        settings = config.get('rate_limits', {}).get(name, {})
+        return cls(
+            name,
+            rate=settings.get('rate'),
+            burst=settings.get('burst', 1),
+            initial_concurrency=settings.get('initial_concurrency', max_concurrency),
+            min_concurrency=settings.get('min_concurrency', 1),
+            max_concurrency=settings.get('max_concurrency', max_concurrency),
+            decrease=settings.get('decrease', 0.5),
+            default_retry_after=settings.get('default_retry_after', 1.0),
+        )
+
+    @property
+    def queue_depth(self):
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "concurrency_limit": int(self.limit),
+            "throttled": self.throttled,
+        }
+
+    async def acquire(self, priority=None):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (request_priority.get() if priority is None else priority,
+                                       next(self._sequence), future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the slot was granted just as the caller went away
+                self.in_flight -= 1
+                self._dispatch()
+            raise
+        finally:
+            self._publish()
+
+    def release(self, response=None):
+        # response is the upstream reply, or None when the call never got one
+        self.in_flight -= 1
+        if response is not None:
+            if response.status_code in throttle_status_codes:
+                self.throttled += 1
+                self.limit = max(self.min_concurrency, self.limit * self.decrease)
+                retry_after = parse_retry_after(response.headers.get('retry-after'))
+                delay = self.default_retry_after if retry_after is None else retry_after
+                self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+                metrics.inc("upstream_throttled_total", upstream=self.name)
+                logging.warning(f"{self.name} throttled ({response.status_code}), "
+                                f"concurrency limit {int(self.limit)}, pausing {delay:.1f} s")
+            elif response.status_code < 500:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+        self._dispatch()
+        self._publish()
+
+    def _refill(self, now):
+        if self.rate is None:
+            self._tokens = float(self.burst)
+            return
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _dispatch(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            if self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+                continue
+            now = time.monotonic()
+            if now < self._blocked_until:
+                self._wake_at(self._blocked_until - now)
+                return
+            self._refill(now)
+            if self._tokens < 1:
+                self._wake_at((1 - self._tokens) / self.rate)
+                return
+            self._tokens -= 1
+            self.in_flight += 1
+            heapq.heappop(self._waiters)[2].set_result(None)
+
+    def _wake_at(self, delay):
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def _publish(self):
+        metrics.gauge_set("upstream_queue_depth", self.queue_depth, upstream=self.name)
+        metrics.gauge_set("upstream_concurrency_limit", int(self.limit), upstream=self.name)
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+import threading
+from output_store import stream_to_temp_file
+
+
+def quantize_color(color_code, step=8):
+    # snap each channel to the middle of its bucket, nearby colors render the same
+    channels = [int(color_code[i:i+2], 16) for i in (1, 3, 5)]
+    quantized = [min(255, (c // step) * step + step // 2) if step > 1 else c for c in channels]
+    return '#{:02x}{:02x}{:02x}'.format(*quantized)
+
+
+class RenderCache:
+    def __init__(self, directory="render_cache", max_bytes=512 * 1024 * 1024,
+                 quantize_step=8, deterministic_seed=False, enabled=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.quantize_step = quantize_step
+        self.deterministic_seed = deterministic_seed
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._sizes = {}
+        if enabled:
+            os.makedirs(directory, exist_ok=True)
+            for name in os.listdir(directory):
+                if name.endswith('.png'):
+                    path = os.path.join(directory, name)
+                    self._sizes[path] = os.path.getsize(path)
+
+    @classmethod
+    def from_config(cls, config):
+        settings = config.get('render_cache', {})
+        return cls(
+            directory=settings.get('directory', "render_cache"),
+            max_bytes=settings.get('max_bytes', 512 * 1024 * 1024),
+            quantize_step=settings.get('quantize_step', 8),
+            deterministic_seed=settings.get('deterministic_seed', False),
+            enabled=settings.get('enabled', True),
+        )
+
+    @property
+    def seed_policy(self):
+        return "per-color" if self.deterministic_seed else "random"
+
+    def quantize(self, color_code):
+        return quantize_color(color_code, self.quantize_step)
+
+    def key(self, color_code, prompt_template, steps, width, height):
+        params = {
+            "color": self.quantize(color_code),
+            "prompt": prompt_template,
+            "steps": steps,
+            "width": width,
+            "height": height,
+            "seed": self.seed_policy,
+        }
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    def seed_for(self, color_code):
+        if not self.deterministic_seed:
+            return random.randrange(sys.maxsize)
+        digest = hashlib.sha256(self.quantize(color_code).encode()).digest()
+        return int.from_bytes(digest[:8], 'big') % sys.maxsize
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        path = self.path_for(key)
+        with self._lock:
+            try:
+                # renders written by another process (cli.py prewarm) are not indexed yet
+                if path not in self._sizes:
+                    self._sizes[path] = os.path.getsize(path)
+                    self._evict(keep=path)
+                os.utime(path)
+            except OSError:
+                self._sizes.pop(path, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return path
+
+    async def put_stream(self, key, chunks):
+        path = self.path_for(key)
+        temp_path, sink = await stream_to_temp_file(chunks, self.directory)
+        os.replace(temp_path, path)
+        with self._lock:
+            self._sizes[path] = sink.size
+            self._evict(keep=path)
+        return path
+
+    def _evict(self, keep=None):
+        total = sum(self._sizes.values())
+        if total <= self.max_bytes:
+            return
+        # least recently used first, get() refreshes mtime on every hit
+        by_age = sorted(self._sizes, key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+        for path in by_age:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            total -= self._sizes.pop(path)
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.error(f"Error evicting cached render {path}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._sizes),
+                "bytes": sum(self._sizes.values()),
+            }
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import random
+import httpx
+from rate_limiter import AdaptiveLimiter
+
+retry_status_codes = {429, 500, 502, 503, 504}
+
+
+class StableDiffusionClient:
+    def __init__(self, url, max_concurrency=2, max_connections=4, timeout=300.0,
+                 connect_timeout=10.0, retries=3, backoff=1.0, max_backoff=30.0, limiter=None,
+                 progress_url=None):
+        self.url = url
+        # AUTOMATIC1111 reports per-task progress at /internal/progress on the same server
+        if progress_url is None and url.rstrip('/').endswith('/sdapi/v1/txt2img'):
+            progress_url = url.rstrip('/')[:-len('/sdapi/v1/txt2img')] + '/internal/progress'
+        self.progress_url = progress_url
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # the limiter caps renders in flight at max_concurrency and backs off on 429/503
+        self.limiter = limiter or AdaptiveLimiter("stable_diffusion", max_concurrency=max_concurrency)
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+
+    @classmethod
+    def from_config(cls, config):
+        settings = config.get('stable_diffusion', {})
+        return cls(
+            config['stable_url'],
+            max_concurrency=settings.get('max_concurrency', 2),
+            max_connections=settings.get('max_connections', 4),
+            timeout=settings.get('timeout', 300.0),
+            connect_timeout=settings.get('connect_timeout', 10.0),
+            retries=settings.get('retries', 3),
+            backoff=settings.get('backoff', 1.0),
+            max_backoff=settings.get('max_backoff', 30.0),
+            progress_url=settings.get('progress_url'),
+            limiter=AdaptiveLimiter.from_config(
+                config, "stable_diffusion", max_concurrency=settings.get('max_concurrency', 2)
+            ),
+        )
+
+    def _delay(self, attempt):
+        # exponential backoff with full jitter so several kiosks do not retry in step
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def txt2img(self, payload):
+        async def read_json(response):
+            await response.aread()
+            return response.json()
+        return await self.txt2img_stream(payload, read_json)
+
+    async def txt2img_stream(self, payload, consume):
+        # consume(response) reads the streamed body, so large base64 images never
+        # have to sit in memory as one JSON document
+        for attempt in range(self.retries + 1):
+            await self.limiter.acquire()
+            response = None
+            try:
+                async with self._client.stream('POST', self.url, json=payload) as response:
+                    if response.status_code in retry_status_codes and attempt < self.retries:
+                        logging.warning(f"txt2img returned {response.status_code}, retrying")
+                    else:
+                        response.raise_for_status()
+                        return await consume(response)
+            except httpx.TransportError as e:
+                if attempt >= self.retries:
+                    raise
+                logging.warning(f"txt2img request failed ({e!r}), retrying")
+            finally:
+                self.limiter.release(response)
+            await asyncio.sleep(self._delay(attempt))
+
+    async def progress(self, task_id, last_preview_id=-1):
+        # progress of the render submitted with force_task_id=task_id and, when there is
+        # one newer than last_preview_id, its live preview as a data URI; None when
+        # there is no progress endpoint
+        if not self.progress_url:
+            return None
+        try:
+            response = await self._client.post(self.progress_url, json={
+                "id_task": task_id, "id_live_preview": last_preview_id, "live_preview": True,
+            })
+            response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            logging.warning(f"txt2img progress unavailable: {e}")
+            return None
+
+    async def aclose(self):
+        await self._client.aclose()
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import logging
+
+max_body_bytes = 64 * 1024
+reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+           500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class VisualServer:
+    # Minimal HTTP/1.1 front end for VisualPipeline: a fixed pool of workers drains a
+    # bounded queue, and requests beyond the queue are turned away with a 503.
+    def __init__(self, pipeline, host="127.0.0.1", port=8080, workers=4, queue_size=64):
+        self.pipeline = pipeline
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.queue_size = queue_size
+        self._queue = None
+        self._server = None
+        self._worker_tasks = []
+
+    @classmethod
+    def from_config(cls, config, pipeline):
+        settings = config.get('server', {})
+        return cls(
+            pipeline,
+            host=settings.get('host', "127.0.0.1"),
+            port=settings.get('port', 8080),
+            workers=settings.get('workers', 4),
+            queue_size=settings.get('queue_size', 64),
+        )
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._worker_tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logging.info(f"Serving visuals on http://{self.host}:{self.port} with {self.workers} workers")
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+
+    async def _worker(self):
+        while True:
+            request, future = await self._queue.get()
+            try:
+                if not future.cancelled():
+                    result = await self.pipeline.create_visual(
+                        request['mood'], request['checkout_time'], render=request.get('render', True)
+                    )
+                    if not future.cancelled():
+                        future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def _handle(self, reader, writer):
+        try:
+            status, body = await self._dispatch(reader)
+        except Exception as e:
+            logging.error(f"Error handling request: {e}")
+            status, body = 500, {"error": str(e)}
+        payload = json.dumps(body).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {reasons.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + payload
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _dispatch(self, reader):
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) < 2:
+            return 400, {"error": "malformed request line"}
+        method, path = request_line[0], request_line[1]
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if method == 'GET' and path == '/healthz':
+            return 200, {
+                "status": "ok",
+                "queue_depth": self._queue.qsize(),
+                "active_visuals": self.pipeline.active_visuals,
+                "upstreams": self.pipeline.upstream_stats(),
+            }
+        if method != 'POST' or path != '/visual':
+            return 404, {"error": f"no route for {method} {path}"}
+
+        try:
+            length = int(headers.get('content-length', 0))
+            if length > max_body_bytes:
+                return 413, {"error": "request body too large"}
+            request = json.loads(await reader.readexactly(length))
+        except (ValueError, asyncio.IncompleteReadError):
+            request = None
+        if not isinstance(request, dict) or not all(
+            isinstance(request.get(field), str) for field in ('mood', 'checkout_time')
+        ):
+            return 400, {"error": "expected a JSON body with string mood and checkout_time"}
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((request, future))
+        except asyncio.QueueFull:
+            return 503, {"error": "server busy", "queue_depth": self._queue.qsize()}
+        return 200, await future
@@ -0,0 +1,45 @@
+import asyncio
+from metrics import metrics
+
+
+class SingleFlight:
+    # Concurrent calls with the same key share one in-flight coroutine and all get its
+    # result or exception. Waiters are counted per call: a waiter that is cancelled (a
+    # sibling GPT-4 call failing, a timeout, a client hanging up) leaves the call running
+    # for the others, and the last one to go cancels it so it stops holding upstream slots.
+    def __init__(self, name):
+        self.name = name
+        self._flights = {}
+        self._waiters = {}
+
+    def __len__(self):
+        return len(self._flights)
+
+    async def do(self, key, factory):
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._flights[key] = task
+            self._waiters[task] = 0
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            metrics.inc("visual_coalesced_total", call=self.name)
+        self._waiters[task] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    # nobody is left waiting; new callers start a fresh call
+                    if self._flights.get(key) is task:
+                        del self._flights[key]
+                    task.cancel()
+
+    def _forget(self, key, task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            # nobody may be left awaiting it; mark the exception as retrieved
+            task.exception()
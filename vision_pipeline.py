@@ -0,0 +1,73 @@
+import asyncio
+from pipeline import VisualPipeline
+from metrics import metrics
+from image_prep import VisionImageCache
+from singleflight import SingleFlight
+
+
+class VisionVisualPipeline(VisualPipeline):
+    def __init__(self, config):
+        super().__init__(config)
+        self.vision_images = VisionImageCache.from_config(config)
+        self.vision_detail = config.get('vision', {}).get('detail', "low")
+        self.vision_flights = SingleFlight("gpt4_vision")
+
+    async def process_mood_and_time(self, mood_text, checkout_time_str):
+        emotion_color_map = await self.generate_emotion_color_mapping(mood_text)
+        datetime_factor = self.calculate_datetime_factor(checkout_time_str)
+        return emotion_color_map.get(mood_text, "#808080"), datetime_factor
+
+    async def fetch_emotion_color_mapping(self, mood_text):
+        with metrics.span("gpt4_mapping"):
+            result = await self.post_chat_completion({
+                "model": "gpt-4",
+                "messages": [
+                    {"role": "system", "content": "Determine the sentiment of the following text. Provide HTML color codes."},
+                    {"role": "user", "content": mood_text}
+                ]
+            })
+        emotion_color_map = self.parse_emotion_color_mapping(result)
+        if emotion_color_map:
+            self.mapping_cache.put(mood_text, emotion_color_map)
+        return emotion_color_map
+
+    def parse_emotion_color_mapping(self, gpt4_response):
+        response_text = gpt4_response['choices'][0]['message']['content']
+        emotion_color_map = {}
+        for line in response_text.split('\n'):
+            if ':' in line:
+                emotion, color = line.split(':', 1)
+                emotion_color_map[emotion.strip().lower()] = color.strip()
+        return emotion_color_map
+
+    async def interpret_gpt4_sentiment(self, image_path):
+        # Downscale and re-encode as a bounded JPEG off the loop; the payload and the
+        # reply are memoized by content hash, so the same render is never sent twice
+        with metrics.span("vision_image_prep"):
+            digest, data_uri = await asyncio.get_running_loop().run_in_executor(
+                None, self.vision_images.prepare, image_path
+            )
+        sentiment = self.vision_images.get_result(digest)
+        metrics.cache_result("vision", sentiment is not None)
+        if sentiment is not None:
+            return sentiment
+        return await self.vision_flights.do(digest, lambda: self.request_vision_sentiment(digest, data_uri))
+
+    async def request_vision_sentiment(self, digest, data_uri):
+        # Formulate a prompt for GPT-4 Vision to interpret the sentiment
+        prompt = "What is the sentiment conveyed in this image?"
+
+        with metrics.span("gpt4_vision"):
+            result = await self.post_chat_completion({
+                "model": "gpt-4-vision-preview",
+                "messages": [
+                    {"role": "system", "content": "Analyze the sentiment of the following image."},
+                    {"role": "user", "content": [{"type": "image_url", "image_url": {"url": data_uri, "detail": self.vision_detail}}]},
+                    {"role": "user", "content": prompt}
+                ]
+            })
+
+        # Extract the sentiment from GPT-4's response
+        sentiment = result['choices'][0]['message']['content'].strip().lower()
+        self.vision_images.put_result(digest, sentiment)
+        return sentiment